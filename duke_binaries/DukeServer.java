@@ -0,0 +1,49 @@
+// Long-lived duke process used by powerplantmatching.duke with the matching
+// backend 'duke-server'. Run it with java >= 11 in source-file mode:
+//
+//     java -cp <duke jars> DukeServer.java
+//
+// Each line on stdin holds the tab-separated command line arguments of one
+// duke run. The error output of the run is written to stdout, followed by a
+// line containing only __END_OF_DUKE_RUN__. The server terminates at the end
+// of its input.
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+
+public class DukeServer {
+    static final String END_OF_RUN = "__END_OF_DUKE_RUN__";
+
+    public static void main(String[] argv) throws Exception {
+        BufferedReader in = new BufferedReader(
+            new InputStreamReader(System.in, "UTF-8"));
+        PrintStream out = new PrintStream(
+            new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        PrintStream err = System.err;
+        // keep stdout free for the protocol, e.g. for --showmatches
+        System.setOut(err);
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            if (line.trim().isEmpty())
+                continue;
+            ByteArrayOutputStream captured = new ByteArrayOutputStream();
+            System.setErr(new PrintStream(captured, true, "UTF-8"));
+            try {
+                no.priv.garshol.duke.Duke.main(line.split("\t"));
+            } catch (Throwable e) {
+                System.err.println("ERROR: " + e);
+                e.printStackTrace(System.err);
+            } finally {
+                System.err.flush();
+                System.setErr(err);
+            }
+            out.println(captured.toString("UTF-8"));
+            out.println(END_OF_RUN);
+        }
+    }
+}
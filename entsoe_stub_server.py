@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the ENTSO-E Transparency API, which replays the responses
+saved by powerplantmatching.data.fetch_entsoe() in data/out/entsoe. Start it
+with
+
+    python entsoe_stub_server.py --port 8000 --delay 0.5
+
+and set 'entsoe_url: http://localhost:8000/api' in config.yaml in order to
+run powerplantmatching.data.ENTSOE(update=True) offline, e.g. for
+benchmarking the update. Domains without saved response are answered like
+the API does for domains without data.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlparse, parse_qs
+
+no_data = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Acknowledgement_MarketDocument
+    xmlns="urn:iec62325.351:tc57wg16:451-1:acknowledgementdocument:7:0">
+    <Reason>
+        <code>999</code>
+        <text>No matching data found</text>
+    </Reason>
+</Acknowledgement_MarketDocument>
+"""
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def make_handler(directory, delay):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            domain = query.get('In_Domain', [''])[0]
+            fn = os.path.join(directory, '{}.xml'.format(domain))
+            time.sleep(delay)
+            if domain and os.path.exists(fn):
+                with open(fn, 'rb') as f:
+                    content = f.read()
+                self.send_response(200)
+            else:
+                content = no_data
+                self.send_response(400)
+            self.send_header('Content-Type', 'text/xml')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--delay', type=float, default=0.,
+                        help='seconds to wait before each response')
+    parser.add_argument('--directory', help='directory of the saved '
+                        'responses, defaults to data/out/entsoe',
+                        default=os.path.join(os.path.dirname(
+                            os.path.abspath(__file__)),
+                            'data', 'out', 'entsoe'))
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('localhost', args.port),
+                                 make_handler(args.directory, args.delay))
+    print('Replaying responses from {} on http://localhost:{}/api'
+          .format(args.directory, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -26,7 +26,7 @@ from __future__ import absolute_import
 
 from .utils import _data_out
 from . import (config, cleaning, data, heuristics, export, matching, utils,
-               collection, plot)
+               collection, plot, linkage)
 
 # Logging: General Settings
 import logging
@@ -21,16 +21,128 @@ from __future__ import absolute_import, print_function
 
 from .config import get_config
 from .duke import duke
-from .utils import _data_out
+from .utils import _data_out, set_categories
 
 import numpy as np
 import pandas as pd
-import networkx as nx
+from six import string_types
+import collections
+import hashlib
+import re
 import logging
 logger = logging.getLogger(__name__)
 
 
-def clean_powerplantname(df):
+# words which are removed from the names, in addition to the words appearing
+# at least `common_word_count` times in the dataset
+stopwords = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X', 'XI',
+             'Grupo', 'parque', 'eolico', 'gas', 'biomasa', 'COGENERACION',
+             'gt', 'unnamed', 'tratamiento de purines', 'planta', 'de', 'la',
+             'station', 'power', 'storage', 'plant', 'stage', 'pumped',
+             'project', 'dt', 'gud', 'hkw', 'kbr', 'Kernkraft',
+             'Kernkraftwerk', 'kwg', 'krb', 'ohu', 'gkn',
+             'Gemeinschaftskernkraftwerk', 'kki', 'kkp', 'kle', 'wkw', 'rwe',
+             'bis', 'nordsee', 'ostsee', 'dampfturbinenanlage', 'ikw', 'kw',
+             'kohlekraftwerk', 'raffineriekraftwerk', 'Kraftwerke']
+common_word_count = 20
+_separators = re.compile(u'[-/,()\\[\\]"_+0-9]')
+
+
+# maximal number of cleaned names held in memory by the name cache
+name_cache_size = 200000
+_name_cache = collections.OrderedDict()
+# version of the cleaning rules which do not depend on the dataset, the
+# cached tokens are only valid for this version
+_cleaning_version = hashlib.sha1(
+    u'\n'.join([_separators.pattern] + stopwords).encode('utf-8')
+    ).hexdigest()[:12]
+_phrases = re.compile(u'(?i)(^|\\s)(?:{})(?=\\s|$)'.format(
+    u'|'.join(re.escape(w) for w in stopwords if ' ' in w)))
+_stopwords = set(w.lower() for w in stopwords if ' ' not in w)
+
+
+def _clean_name(name):
+    """
+    Split a raw name into its tokens. Separators and the phrases in
+    `stopwords` are replaced by spaces, single letters and the other stop
+    words are dropped (case insensitive).
+    """
+    name = _phrases.sub(u' ', _separators.sub(u' ', name))
+    return [w for w in name.split()
+            if w.lower() not in _stopwords
+            and not (len(w) == 1 and u'a' <= w.lower() <= u'z')]
+
+
+def _name_cache_db():
+    """
+    Connection to the on-disk name cache, shared by all configurations
+    """
+    import sqlite3
+    con = sqlite3.connect(_data_out('../name_cache.sqlite'), timeout=60)
+    con.execute('CREATE TABLE IF NOT EXISTS tokens (version TEXT, raw TEXT, '
+                'tokens TEXT, PRIMARY KEY (version, raw))')
+    return con
+
+
+def cached_names(raw, persistent=False):
+    """
+    Return the tokens of a list of raw names, see _clean_name(). The
+    results are looked up in an in-memory LRU cache (bounded by
+    `name_cache_size`) and optionally in the on-disk cache
+    data/out/name_cache.sqlite, keyed by the raw name and the version of the
+    stop words. Only names missing in both are cleaned. As the tokens do not
+    depend on the dataset, all importers and aggregate_units() share the
+    cache.
+
+    Parameters
+    ----------
+    raw : list of str
+        distinct raw names
+    persistent : Boolean, default False
+        Whether to use the on-disk cache
+    """
+    version = _cleaning_version
+    found = {}
+    for n in raw:
+        hit = _name_cache.pop((version, n), None)
+        if hit is not None:
+            _name_cache[(version, n)] = found[n] = hit
+
+    missing = [n for n in raw if n not in found]
+    con = None
+    if persistent and missing:
+        try:
+            con = _name_cache_db()
+        except Exception as e:
+            logger.warning('Name cache on disk not available: {}'.format(e))
+    if con is not None:
+        with con:
+            # look up the missing names only, in chunks below the limit of
+            # sqlite on the number of query parameters
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                for n, tokens in con.execute(
+                        'SELECT raw, tokens FROM tokens WHERE version = ? '
+                        'AND raw IN ({})'.format(', '.join('?' * len(chunk))),
+                        [version] + chunk):
+                    found[n] = tokens.split()
+            new = {n: _clean_name(n) for n in missing if n not in found}
+            con.executemany('INSERT OR REPLACE INTO tokens VALUES (?,?,?)',
+                            [(version, n, u' '.join(t))
+                             for n, t in new.items()])
+        con.close()
+    else:
+        new = {n: _clean_name(n) for n in missing}
+    found.update(new)
+
+    for n in missing:
+        _name_cache[(version, n)] = found[n]
+    while len(_name_cache) > name_cache_size:
+        _name_cache.popitem(last=False)
+    return [found[n] for n in raw]
+
+
+def clean_powerplantname(df, cache=None, config=None):
     """
     Cleans the column "Name" of the database by deleting very frequent
     words, numericals and nonalphanumerical characters of the
@@ -40,43 +152,78 @@ def clean_powerplantname(df):
     ----------
     df : pandas.Dataframe
         dataframe to be cleaned
+    cache : str, default None
+        Reuse the tokens of names cleaned before, either within this session
+        ('memory') or also from previous sessions ('disk'), see
+        cached_names(). Set to False to disable. Defaults to the config entry
+        'name_cache'.
+    config : dict, default None
+        Add custom specific configuration,
+        e.g. powerplantmatching.config.get_config(target_countries='Italy'),
+        defaults to powerplantmatching.config.get_config()
 
     """
-    df = df[df.Name.notnull()]
-    name = df.Name.replace(regex=True, value=' ',
-                           to_replace=['-', '/', ',', '\(', '\)', '\[', '\]',
-                                       '"', '_', '\+', '[0-9]'])
-
-    common_words = pd.Series(sum(name.str.split(), [])).value_counts()
-    cw = list(common_words[common_words >= 20].index)
-
-    pattern = [('(?i)(^|\s)'+x+'(?=\s|$)')
-               for x in (cw +
-                         ['[a-z]', 'I', 'II', 'III', 'IV', 'V', 'VI', 'VII',
-                          'VIII', 'IX', 'X', 'XI', 'Grupo', 'parque', 'eolico',
-                          'gas', 'biomasa', 'COGENERACION', 'gt', 'unnamed',
-                          'tratamiento de purines', 'planta', 'de', 'la',
-                          'station', 'power', 'storage', 'plant', 'stage',
-                          'pumped', 'project', 'dt', 'gud', 'hkw', 'kbr',
-                          'Kernkraft', 'Kernkraftwerk', 'kwg', 'krb', 'ohu',
-                          'gkn', 'Gemeinschaftskernkraftwerk', 'kki', 'kkp',
-                          'kle', 'wkw', 'rwe', 'bis', 'nordsee', 'ostsee',
-                          'dampfturbinenanlage', 'ikw', 'kw', 'kohlekraftwerk',
-                          'raffineriekraftwerk', 'Kraftwerke'])]
-    name = (name
-            .replace(regex=True, to_replace=pattern, value=' ')
-            .replace('\s+', ' ', regex=True)
-            .replace('"', '', regex=True)
-            .str.strip()
-            .str.capitalize())
+    if cache is None:
+        if config is None:
+            config = get_config()
+        cache = config.get('name_cache', 'memory')
 
+    df = df[df.Name.notnull()]
+    # every distinct name is cleaned only once
+    codes, raw = pd.factorize(df.Name)
+    if cache:
+        tokens = cached_names(list(raw), persistent=cache == 'disk')
+    else:
+        tokens = [_clean_name(n) for n in raw]
+
+    # the words occurring at least `common_word_count` times in the dataset
+    # are removed as well
+    counts = collections.Counter()
+    for t, occurences in zip(tokens, np.bincount(codes, minlength=len(raw))):
+        for word in t:
+            counts[word] += occurences
+    frequent = set(w.lower() for w, c in counts.items()
+                   if c >= common_word_count)
+    name = np.array([u' '.join(w for w in t if w.lower() not in frequent)
+                     .capitalize() for t in tokens], dtype=object)
     return (df
-            .assign(Name=name)
+            .assign(Name=name[codes])
             .loc[lambda x: x.Name != '']
             .sort_values('Name')
             .reset_index(drop=True))
 
 
+def find_keywords(df, keywords, search_col):
+    """
+    Find the keywords of several categories in the columns search_col of
+    df (case insensitive). Each distinct value of a column is scanned once
+    per category. Returns a dataframe with a column for each pair of category
+    and search column. The columns hold the found keywords joined by ', ',
+    or NaN if none were found.
+
+    Parameters
+    ----------
+    keywords : dict
+        lists of keywords (regular expressions) by category
+    search_col : list
+        Specify the columns to be parsed
+    """
+    patterns = {cat: re.compile(u'(?i)' + u'|'.join(words))
+                for cat, words in keywords.items()}
+    found = {}
+    for col in search_col:
+        codes, uniques = pd.factorize(df[col])
+        for cat, pattern in patterns.items():
+            joined = [(u', '.join(pattern.findall(u)) or np.nan)
+                      if isinstance(u, string_types) else np.nan
+                      for u in uniques]
+            # the code -1 of missing values selects the appended NaN
+            joined = np.append(np.asarray(joined, dtype=object), np.nan)
+            found[(cat, col)] = joined[codes]
+    return pd.DataFrame(found, index=df.index,
+                        columns=pd.MultiIndex.from_tuples(list(found)))
+
+
 def gather_fueltype_info(df, search_col=['Name', 'Technology']):
     """
     Parses in search_col columns for distinct coal specifications, e.g.
@@ -87,13 +234,10 @@ def gather_fueltype_info(df, search_col=['Name', 'Technology']):
     search_col : list, default is ['Name', 'Technology']
         Specify the columns to be parsed
     """
-    fueltype = pd.Series(df['Fueltype'])
-
-    for i in search_col:
-        found_b = df[i].dropna().str.contains('(?i)lignite|brown')
-        fueltype.loc[found_b.reindex(fueltype.index,
-                                     fill_value=False)] = 'Lignite'
-    fueltype.replace({'Coal': 'Hard Coal'}, inplace=True)
+    found = find_keywords(df, {'Lignite': ['lignite', 'brown']}, search_col)
+    fueltype = (df['Fueltype']
+                .where(found['Lignite'].isnull().all(axis=1), 'Lignite')
+                .replace({'Coal': 'Hard Coal'}))
 
     return df.assign(Fueltype=fueltype)
 
@@ -117,24 +261,15 @@ def gather_technology_info(df, search_col=['Name', 'Fueltype'],
     if config is None:
         config = get_config()
 
-    technology = (df['Technology'].dropna()
+    technology = (df['Technology']
                   if 'Technology' in df
-                  else pd.Series())
+                  else pd.Series(np.nan, index=df.index, dtype=object))
 
-    pattern = '|'.join(('(?i)'+x) for x in config['target_technologies'])
+    found = find_keywords(df, {'Technology': config['target_technologies']},
+                          search_col)['Technology']
     for i in search_col:
-        found = (df[i].dropna()
-                 .str.findall(pattern)
-                 .loc[lambda s: s.str.len() > 0]
-                 .str.join(sep=', '))
-
-        exists_i = technology.index.intersection(found.index)
-        if len(exists_i) > 0:
-            technology.loc[exists_i] = (technology.loc[exists_i].str
-                                        .cat(found.loc[exists_i], sep=', '))
-
-        new_i = found.index.difference(technology.index)
-        technology = technology.append(found[new_i])
+        technology = ((technology + ', ' + found[i])
+                      .fillna(technology).fillna(found[i]))
 
     return df.assign(Technology=technology)
 
@@ -154,73 +289,149 @@ def gather_set_info(df, search_col=['Name', 'Fueltype', 'Technology']):
         defaults to powerplantmatching.config.get_config()
 
     """
-    Set = (df['Set'].copy()
+    Set = (df['Set']
            if 'Set' in df
-           else pd.Series(index=df.index))
-
-    pattern = '|'.join(['heizkraftwerk', 'hkw', 'chp', 'bhkw', 'cogeneration',
-                        'power and heat', 'heat and power'])
-    for i in search_col:
-        isCHP_b = df[i].dropna().str.contains(pattern, case=False)\
-                    .reindex(df.index).fillna(False)
-        Set.loc[isCHP_b] = 'CHP'
-
-    pattern = '|'.join(['battery', 'storage'])
-    for i in search_col:
-        isStore_b = df[i].dropna().str.contains(pattern, case=False) \
-                    .reindex(df.index).fillna(False)
-        Set.loc[isStore_b] = 'Store'
+           else pd.Series(np.nan, index=df.index, dtype=object))
+
+    found = find_keywords(df, {'CHP': ['heizkraftwerk', 'hkw', 'chp', 'bhkw',
+                                       'cogeneration', 'power and heat',
+                                       'heat and power'],
+                               'Store': ['battery', 'storage']}, search_col)
+    Set = (Set.where(found['CHP'].isnull().all(axis=1), 'CHP')
+              .where(found['Store'].isnull().all(axis=1), 'Store')
+              .fillna('PP'))
+    return df.assign(Set=Set)
+
+
+# canonicalisation of the technologies, applied in this order:
+#   'sub': replace the (case sensitive) pattern by the value
+#   'equals': replace a technology equal to the pattern by the value
+#   'contains': replace a technology containing the (case insensitive)
+#               pattern by the value
+#   'hydro': same as 'contains', only applied if generalize_hydros is True
+#   'unique': title case and join the distinct claims separated by the pattern
+technology_rules = [
+    ('sub', ' and ', ', '),
+    ('sub', ' Power Plant', ''),
+    ('sub', 'Battery', ''),
+    ('hydro', 'pump', 'Pumped Storage'),
+    ('hydro', 'reservoir|lake', 'Reservoir'),
+    ('hydro', 'run-of-river|weir|water', 'Run-Of-River'),
+    ('hydro', 'dam', 'Reservoir'),
+    ('equals', 'Gas turbine', 'OCGT'),
+    ('contains', 'combined cycle|combustion', 'CCGT'),
+    ('contains', 'steam turbine|critical thermal', 'Steam Turbine'),
+    ('contains', 'ocgt|open cycle', 'OCGT'),
+    ('unique', ', ', None),
+    ('sub', 'Ccgt', 'CCGT'),
+    ('sub', 'Ocgt', 'OCGT')]
+
+
+def clean_technology_value(tech, generalize_hydros=False):
+    """
+    Clean a single technology according to `technology_rules`.
 
-    df = df.assign(Set=Set)
-    df.loc[:, 'Set'].fillna('PP', inplace=True)
-    return df
+    Parameter
+    ---------
+    tech : str
+        Technology to be cleaned
+    generalize_hydros : Boolean, default False
+        Whether to apply the 'hydro' rules
+    """
+    for how, pattern, value in technology_rules:
+        if how == 'sub':
+            tech = re.sub(pattern, value, tech)
+        elif how == 'equals':
+            tech = value if tech == pattern else tech
+        elif how == 'contains' or (how == 'hydro' and generalize_hydros):
+            if re.search(pattern, tech, flags=re.IGNORECASE):
+                tech = value
+        elif how == 'unique':
+            tech = pattern.join(t.strip() for t in
+                                sorted(set(tech.title().split(pattern))))
+    return tech
 
 
 def clean_technology(df, generalize_hydros=False):
     """
     Clean the 'Technology' by condensing down the value into one claim. This
     procedure might reduce the scope of information, however is crucial for
-    comparing different data sources.
+    comparing different data sources. Each distinct value is cleaned only
+    once, see clean_technology_value().
 
     Parameter
     ---------
-    search_col : list, default is ['Name', 'Fueltype', 'Technology']
-        Specify the columns to be parsed
-    config : dict, default None
-        Add custom specific configuration,
-        e.g. powerplantmatching.config.get_config(target_countries='Italy'),
-        defaults to powerplantmatching.config.get_config()
+    generalize_hydros : Boolean, default False
+        Whether to condense hydro technologies into 'Pumped Storage',
+        'Reservoir' and 'Run-Of-River'
 
     """
     tech = df['Technology'].dropna()
     if len(tech) == 0:
         return df
-    tech = tech.replace(
-            {' and ': ', ', ' Power Plant': '', 'Battery': ''}, regex=True)
-    if generalize_hydros:
-        tech[tech.str.contains('pump', case=False)] = 'Pumped Storage'
-        tech[tech.str.contains('reservoir|lake', case=False)] = 'Reservoir'
-        tech[tech.str.contains('run-of-river|weir|water', case=False)] =\
-            'Run-Of-River'
-        tech[tech.str.contains('dam', case=False)] = 'Reservoir'
-    tech = tech.replace({'Gas turbine': 'OCGT'})
-    tech[tech.str.contains('combined cycle|combustion', case=False)] = 'CCGT'
-    tech[tech.str.contains('steam turbine|critical thermal', case=False)] =\
-        'Steam Turbine'
-    tech[tech.str.contains('ocgt|open cycle', case=False)] = 'OCGT'
-    tech = (tech.str.title()
-                .str.split(', ')
-                .apply(lambda x: ', '.join(i.strip() for i in np.unique(x))))
-    tech = tech.replace({'Ccgt': 'CCGT', 'Ocgt': 'OCGT'}, regex=True)
-    return df.assign(Technology=tech)
-
-
-def cliques(df, dataduplicates):
+    codes, uniques = pd.factorize(tech)
+    cleaned = np.array([clean_technology_value(t, generalize_hydros)
+                        for t in uniques], dtype=object)
+    return df.assign(Technology=pd.Series(cleaned[codes], index=tech.index))
+
+
+def clique_partition(graph, component, max_size=None):
+    """
+    Partition the nodes of an undirected graph into cliques. Components
+    which are complete (and not larger than max_size) form one clique each.
+    In all other components, the nodes are visited in order of descending
+    degree, ties broken by position. Each node which is not yet assigned
+    opens a new clique. The clique is extended by the unassigned neighbours,
+    in the same order, as long as they are linked to all of its members and
+    max_size is not exceeded.
+
+    Parameters
+    ----------
+    graph : scipy.sparse.csr_matrix
+        symmetric adjacency matrix without self-loops
+    component : np.array
+        connected component of each node
+    max_size : int, default None
+        Maximal number of nodes in a clique
+    """
+    sizes = np.bincount(component)
+    degree = np.diff(graph.indptr)
+    complete = np.bincount(component, weights=degree) == sizes * (sizes - 1)
+    if max_size is not None:
+        complete &= sizes <= max_size
+    group = np.where(complete[component], component, -1)
+
+    todo = np.flatnonzero(group == -1)
+    order = todo[np.lexsort((todo, -degree[todo]))]
+    rank = np.empty(len(group), dtype=int)
+    rank[order] = np.arange(len(order))
+    label = len(sizes)
+    for i in order:
+        if group[i] != -1:
+            continue
+        members = [i]
+        group[i] = label
+        linked = set(graph.indices[graph.indptr[i]:graph.indptr[i + 1]])
+        for j in sorted(linked, key=rank.__getitem__):
+            if max_size is not None and len(members) >= max_size:
+                break
+            if group[j] != -1 or j not in linked:
+                continue
+            members.append(j)
+            group[j] = label
+            linked &= set(graph.indices[graph.indptr[j]:graph.indptr[j + 1]])
+        label += 1
+    return group
+
+
+def cliques(df, dataduplicates, how='clique', max_size=None):
     """
     Locate cliques of units which are determined to belong to the same
     powerplant.  Return the same dataframe with an additional column
     "grouped" which indicates the group that the powerplant is
-    belonging to.
+    belonging to. Only links which are found in both directions are taken
+    into account. Every unit belongs to exactly one group, the distribution
+    of the group sizes is logged.
 
     Parameters
     ----------
@@ -229,24 +440,109 @@ def cliques(df, dataduplicates):
     dataduplicates : pandas.Dataframe or string
         dataframe or name of the csv-linkfile which determines the
         link within one dataset
+    how : str, default 'clique'
+        Either 'clique', grouping units which are all linked to each other
+        (see clique_partition()), or 'components', grouping all units which
+        are connected directly or indirectly
+    max_size : int, default None
+        Maximal number of units in a group, only for how='clique'
     """
-#    df = read_csv_if_string(df)
-    G = nx.DiGraph()
-    G.add_nodes_from(df.index)
-    G.add_edges_from((r.one, r.two) for r in dataduplicates.itertuples())
-    H = G.to_undirected(reciprocal=True)
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if how not in ('clique', 'components'):
+        raise ValueError("Grouping has to be 'clique' or 'components', got "
+                         "'{}'".format(how))
+
+    n = len(df)
+    a = df.index.get_indexer(dataduplicates.one)
+    b = df.index.get_indexer(dataduplicates.two)
+    valid = (a != -1) & (b != -1) & (a != b)
+    links = pd.DataFrame({'a': a[valid], 'b': b[valid]}).drop_duplicates()
+    links = links.merge(links.rename(columns={'a': 'b', 'b': 'a'}))
+    graph = coo_matrix((np.ones(len(links)), (links.a, links.b)),
+                       shape=(n, n)).tocsr()
+    component = connected_components(graph, directed=False)[1]
+
+    if how == 'clique':
+        grouped = clique_partition(graph, component, max_size=max_size)
+    else:
+        grouped = component
+    grouped = pd.factorize(grouped)[0]
+
+    sizes = pd.Series(np.bincount(grouped)).value_counts().sort_index()
+    logger.info('Sizes of the {} groups (size: number of groups): {}'
+                .format(len(np.unique(grouped)), ', '.join(
+                    '{}: {}'.format(*x) for x in sizes.items())))
+    return df.assign(grouped=grouped)
 
-    grouped = pd.Series(np.nan, index=df.index)
-    for i, inds in enumerate(nx.algorithms.clique.find_cliques(H)):
-        grouped.loc[inds] = i
 
-    return df.assign(grouped=grouped)
+def most_frequent(groups, values):
+    """
+    Return the most frequent value of each group, missing values included.
+    Ties are resolved by the first appearance of the values.
+
+    Parameters
+    ----------
+    groups : np.array
+        integer group of each value
+    values : pd.Series or np.array
+        values to aggregate
+    """
+    codes, uniques = pd.factorize(values)
+    counts = (pd.DataFrame({'group': groups, 'value': codes,
+                            'position': np.arange(len(codes))})
+              .groupby(['group', 'value']).position.agg(['size', 'min'])
+              .reset_index()
+              .sort_values(['group', 'size', 'min'],
+                           ascending=[True, False, True])
+              .drop_duplicates('group'))
+    # the code -1 of missing values selects the appended NaN
+    uniques = np.append(np.asarray(uniques, dtype=object), np.nan)
+    return pd.Series(uniques[counts.value.values], index=counts.group.values)
+
+
+def aggregate_groups(df, grouped, how):
+    """
+    Vectorised aggregation of a dataframe by integer groups, equivalent to
+    df.groupby(grouped).agg(how).
+
+    Parameters
+    ----------
+    df : pandas.Dataframe
+        dataframe to aggregate
+    grouped : pd.Series
+        group of each row, rows with missing groups are dropped
+    how : dict
+        aggregation of each column, either 'mode' for the most frequent value
+        (see most_frequent()), 'list' for the list of all values or the name
+        of a cythonised groupby function like 'sum', 'mean', 'min', 'max'
+    """
+    codes, keys = pd.factorize(grouped, sort=True)
+    df, codes = df[codes != -1], codes[codes != -1]
+    if len(df) == 0:
+        return df.iloc[:0].reindex(columns=list(how))
+
+    cythonised = {col: f for col, f in how.items()
+                  if f not in ('mode', 'list')}
+    res = (df[list(cythonised)].groupby(codes).agg(cythonised)
+           .reindex(np.arange(len(keys))))
+    order = np.argsort(codes, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    for col, f in how.items():
+        if f == 'mode':
+            res[col] = most_frequent(codes, df[col].values)
+        elif f == 'list':
+            res[col] = [list(x) for x in np.split(df[col].values[order],
+                                                  bounds)]
+    return res.set_index(keys).reindex(columns=list(how))
 
 
 def aggregate_units(df, dataset_name=None,
                     pre_clean_name=True,
                     save_aggregation=True,
                     use_saved_aggregation=False,
+                    blocking=None,
                     config=None):
     """
     Vertical cleaning of the database. Cleans the "Name"-column, sums
@@ -268,39 +564,49 @@ def aggregate_units(df, dataset_name=None,
         with XX being the name for the dataset. This saves time if you
         want to have aggregated powerplants without running the
         aggregation algorithm again
+    blocking : Boolean or str, default None
+        Only compare candidate pairs of units in the deduplication, see
+        powerplantmatching.duke.duke(). Defaults to the config entry
+        'aggregation_blocking' with the python matching backend and to False
+        otherwise.
     """
     if config is None:
         config = get_config()
-
-    def most_frequent(ds):
-        return ds.value_counts(dropna=False).index[0]
+    if blocking is None:
+        blocking = (config.get('aggregation_blocking', 'country')
+                    if config.get('matching_backend', 'duke') == 'python'
+                    else False)
 
     weighted_cols = [col for col in ['Efficiency', 'Duration']
                      if col in config['target_columns']]
     df = (df.assign(**{col: df[col] * df.Capacity for col in weighted_cols})
             .assign(lat=df.lat.astype(float),
                     lon=df.lon.astype(float)))
+    if 'Technology' not in df:
+        # compared by the deduplication, also if unknown
+        df = df.assign(Technology=pd.Series(np.nan, index=df.index,
+                                            dtype=object))
 
     props_for_groups = pd.Series({
-                'Name': most_frequent,
-                'Country': most_frequent,
-                'Fueltype': most_frequent,
-                'Technology': most_frequent,
-                'Set': most_frequent,
-                'File': most_frequent,
-                'Capacity': pd.Series.sum,
-                'lat': pd.Series.mean,
-                'lon': pd.Series.mean,
-                'YearCommissioned': pd.Series.min,
-                'Retrofit': pd.Series.max,
-                'projectID': pd.Series.tolist,
-                'Duration': pd.Series.sum,  # note this is weighted sum
-                'Efficiency': pd.Series.mean  # note this is weighted mean
+                'Name': 'mode',
+                'Country': 'mode',
+                'Fueltype': 'mode',
+                'Technology': 'mode',
+                'Set': 'mode',
+                'File': 'mode',
+                'Capacity': 'sum',
+                'lat': 'mean',
+                'lon': 'mean',
+                'YearCommissioned': 'min',
+                'Retrofit': 'max',
+                'projectID': 'list',
+                'Duration': 'sum',  # note this is weighted sum
+                'Efficiency': 'mean'  # note this is weighted mean
                 })[config['target_columns']].to_dict()
 
     if pre_clean_name:
         logger.info("Cleaning plant names in '{}'.".format(dataset_name))
-        df = clean_powerplantname(df)
+        df = clean_powerplantname(df, config=config)
 
     logger.info("Aggregating blocks to entire units in '{}'."
                 .format(dataset_name))
@@ -323,17 +629,19 @@ def aggregate_units(df, dataset_name=None,
                 df.drop('grouped', axis=1, inplace=True)
 
     if 'grouped' not in df:
-        duplicates = duke(df)
-        df = cliques(df, duplicates)
+        duplicates = duke(df, blocking=blocking, config=config)
+        df = cliques(df, duplicates,
+                     how=config.get('aggregation_grouping', 'clique'))
         if save_aggregation:
             df.grouped.to_csv(path_name)
-    df = df.groupby('grouped').agg(props_for_groups)
+    df = aggregate_groups(df, df.grouped, props_for_groups)
     df = (df
           .assign(**{col: df[col].div(df['Capacity'])
                   for col in weighted_cols})
           .reset_index(drop=True)
-          .pipe(clean_powerplantname)
-          .reindex(columns=config['target_columns']))
+          .pipe(clean_powerplantname, config=config)
+          .reindex(columns=config['target_columns'])
+          .pipe(set_categories, config=config))
     return df
 
 
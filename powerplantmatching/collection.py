@@ -20,8 +20,9 @@ Processed datasets of merged and/or adjusted data
 from __future__ import print_function
 
 from .utils import (set_uncommon_fueltypes_to_other, _data_out, parmap,
-                    to_dict_if_string, projectID_to_dict)
-from .data import data_config
+                    to_dict_if_string, set_categories, cache_file,
+                    write_cache, read_cache)
+from .sources import source_registry
 from .cleaning import aggregate_units
 from .matching import combine_multiple_datasets, reduce_matched_dataframe
 from .heuristics import (extend_by_non_matched, extend_by_VRE,
@@ -56,15 +57,18 @@ def collect(datasets, update=False, use_saved_aggregation=True,
     reduced : bool
         Switch as to return the reduced (True) or matched (False) dataset.
     custom_config : dict
-        Updates to the data_config dict from data module
+        Updates to the source_registry dict from sources module
     **dukeargs : keyword-args for duke
+        Also passed to link_multiple_datasets() and compare_two_datasets(),
+        e.g. incremental=True only matches the entries which changed since
+        the last matching, progress=callback reports the compared pairs
     """
 
     if config is None:
         config = get_config()
 
     def df_by_name(name):
-        conf = data_config[name].copy()
+        conf = source_registry[name].copy()
         conf.update(custom_config.get(name, {}))
 
         df = conf['read_function'](config=config,
@@ -83,38 +87,36 @@ def collect(datasets, update=False, use_saved_aggregation=True,
 
     datasets = sorted(datasets)
     logger.info('Collect combined dataset for {}'.format(', '.join(datasets)))
-    outfn_matched = _data_out('Matched_{}.csv'
+    outfn_matched = _data_out('Matched_{}'
                               .format('_'.join(map(str.upper, datasets))),
                               config=config)
-    outfn_reduced = _data_out('Matched_{}_reduced.csv'
+    outfn_reduced = _data_out('Matched_{}_reduced'
                               .format('_'.join(map(str.upper, datasets))),
                               config=config)
 
-    if not update and not os.path.exists(outfn_reduced
-                                         if reduced else outfn_matched):
+    if not update and not os.path.exists(cache_file(
+            outfn_reduced if reduced else outfn_matched, config=config)):
         logger.warning("Forcing update since the cache file is missing")
         update = True
         use_saved_aggregation = True
 
     if update:
-        dfs = parmap(df_by_name, datasets)
+        dfs = parmap(df_by_name, datasets, config=config)
         matched = combine_multiple_datasets(
                 dfs, datasets, use_saved_matches=use_saved_matches,
                 config=config, **dukeargs)
-        (matched.assign(projectID=lambda df: df.projectID.astype(str))
-                .to_csv(outfn_matched, index_label='id', encoding='utf-8'))
+        write_cache(matched, outfn_matched, config=config)
 
         reduced_df = reduce_matched_dataframe(matched, config=config)
-        reduced_df.to_csv(outfn_reduced, index_label='id', encoding='utf-8')
+        write_cache(reduced_df, outfn_reduced, config=config)
 
         return reduced_df if reduced else matched
     else:
         if reduced:
-            df = pd.read_csv(outfn_reduced, index_col=0, encoding='utf-8')
+            df = read_cache(outfn_reduced, config=config)
         else:
-            df = pd.read_csv(outfn_matched, index_col=0, header=[0, 1],
-                             encoding='utf-8', low_memory=False)
-        return df.pipe(projectID_to_dict)
+            df = read_cache(outfn_matched, header=[0, 1], config=config)
+        return df.pipe(set_categories, config=config)
 
 
 def Collection(**kwargs):
@@ -137,7 +139,8 @@ def matched_data(config=None,
     Parameters
     ----------
     stored : Bollean, default True
-            Whether to use the stored matched_data.csv file in data/out/default
+            Whether to use the stored matched_data file in data/out/default,
+            see config.yaml/cache_format.
             If False, the matched data is taken from collect() and
             extended afterwards. To update the whole matching, please set
             stored=False and update=True.
@@ -162,15 +165,15 @@ def matched_data(config=None,
         config = get_config()
 
     if collection_kwargs.get('reduced', True):
-        fn = _data_out('matched_data_red.csv')
+        fn = _data_out('matched_data_red')
         header = 0
     else:
-        fn = _data_out('matched_data.csv')
+        fn = _data_out('matched_data')
         header = [0, 1]
 
-    if stored and os.path.exists(fn):
-        return (pd.read_csv(fn, index_col=0, header=header, encoding='utf-8')
-                .pipe(projectID_to_dict))
+    if stored and os.path.exists(cache_file(fn, config=config)):
+        return (read_cache(fn, header=header, config=config)
+                .pipe(set_categories, config=config))
 
     matching_sources = [list(to_dict_if_string(a))[0] for a in
                                   config['matching_sources']]
@@ -189,7 +192,7 @@ def matched_data(config=None,
     # GEO and CARMA
     allowed_countries = config['CARMA_GEO_countries']
     if matched.columns.nlevels > 1:
-        other = matching_sources - set(['CARMA', 'GEO']))
+        other = list(set(matching_sources) - set(['CARMA', 'GEO']))
         matched = (matched[~matched.projectID[other].isna().all(1) |
                            matched.Country.GEO.isin(allowed_countries) |
                            matched.Country.CARMA.isin(allowed_countries)]
@@ -204,7 +207,7 @@ def matched_data(config=None,
                    .reset_index(drop=True))
         if config['remove_missing_coords']:
             matched = matched[matched.lat.notnull()].reset_index(drop=True)
-    matched.to_csv(fn, index_label='id', encoding='utf-8')
+    write_cache(matched, fn, config=config)
 
     if extend_by_vres:
         matched = extend_by_VRE(matched,
@@ -212,7 +215,7 @@ def matched_data(config=None,
 
     if subsume_uncommon_fueltypes:
         matched = set_uncommon_fueltypes_to_other(matched)
-    return matched
+    return matched.pipe(set_categories, config=config)
 
 
 def MATCHED_dataset(**kwargs):
@@ -225,7 +228,7 @@ def MATCHED_dataset(**kwargs):
 # From here on, functions will be deprecated soon!
 
 def Carma_ENTSOE_GEO_GPD_OPSD_matched(update=False,
-                                      use_saved_matches=False,
+                                      use_saved_matches=True,
                                       use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'GEO', 'GPD', 'OPSD'],
                    update=update, use_saved_matches=use_saved_matches,
@@ -234,7 +237,7 @@ def Carma_ENTSOE_GEO_GPD_OPSD_matched(update=False,
 
 
 def Carma_ENTSOE_GEO_GPD_OPSD_matched_reduced(update=False,
-                                              use_saved_matches=False,
+                                              use_saved_matches=True,
                                               use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'GEO', 'GPD', 'OPSD'],
                    update=update, use_saved_matches=use_saved_matches,
@@ -246,7 +249,7 @@ def Carma_ENTSOE_GEO_GPD_OPSD_matched_reduced(update=False,
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_OPSD_matched(update=False,
-                                          use_saved_matches=False,
+                                          use_saved_matches=True,
                                           use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'ESE', 'GEO', 'GPD', 'OPSD'],
                    update=update,
@@ -257,7 +260,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_OPSD_matched(update=False,
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_OPSD_matched_reduced(update=False,
-                                                  use_saved_matches=False,
+                                                  use_saved_matches=True,
                                                   use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'ESE', 'GEO', 'GPD', 'OPSD'],
                    update=update, use_saved_matches=use_saved_matches,
@@ -269,7 +272,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_OPSD_matched_reduced(update=False,
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched(update=False,
-                                                 use_saved_matches=False,
+                                                 use_saved_matches=True,
                                                  use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'ESE', 'GEO', 'GPD', 'IWPDCY', 'OPSD'],
                    update=update, use_saved_matches=use_saved_matches,
@@ -279,7 +282,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched(update=False,
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched_reduced(
-        update=False, use_saved_matches=False, use_saved_aggregation=False):
+        update=False, use_saved_matches=True, use_saved_aggregation=False):
     return collect(['CARMA', 'ENTSOE', 'ESE', 'GEO', 'GPD', 'IWPDCY', 'OPSD'],
                    update=update,
                    use_saved_matches=use_saved_matches,
@@ -289,7 +292,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched_reduced(
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched_reduced_VRE(
-        update=False, use_saved_matches=False, use_saved_aggregation=False,
+        update=False, use_saved_matches=True, use_saved_aggregation=False,
         update_concat=False, base_year=2016):
     if update_concat:
         logger.info('Read base reduced dataframe...')
@@ -315,7 +318,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_matched_reduced_VRE(
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_WEPP_matched(
-        update=False, use_saved_matches=False, use_saved_aggregation=False):
+        update=False, use_saved_matches=True, use_saved_aggregation=False):
     return collect(datasets=['CARMA', 'ENTSOE', 'ESE', 'GEO',
                              'GPD', 'IWPDCY', 'OPSD', 'WEPP'],
                    update=update, use_saved_matches=use_saved_matches,
@@ -325,7 +328,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_WEPP_matched(
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_WEPP_matched_reduced(
-        update=False, use_saved_matches=False, use_saved_aggregation=False):
+        update=False, use_saved_matches=True, use_saved_aggregation=False):
     return collect(datasets=['CARMA', 'ENTSOE', 'ESE', 'GEO',
                              'GPD', 'IWPDCY', 'OPSD', 'WEPP'],
                    update=update,
@@ -336,7 +339,7 @@ def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_WEPP_matched_reduced(
 
 # unpublishable
 def Carma_ENTSOE_ESE_GEO_GPD_IWPDCY_OPSD_WEPP_matched_reduced_VRE(
-        update=False, use_saved_matches=False, use_saved_aggregation=False,
+        update=False, use_saved_matches=True, use_saved_aggregation=False,
         base_year=2015, update_concat=False):
     if update_concat:
         logger.info('Read base reduced dataframe...')
@@ -17,12 +17,25 @@
 
 import hashlib
 import base64
+import copy
 import os
 from six.moves import cPickle as pickle
 import yaml
 import logging
 logger = logging.getLogger(__name__)
 
+# parsed config files by (filename, modification time), such that repeated
+# calls of get_config() do not parse the yaml file again
+_parsed_configs = {}
+
+
+def _parse_config(filename):
+    key = (os.path.abspath(filename), os.path.getmtime(filename))
+    if key not in _parsed_configs:
+        with open(filename) as f:
+            _parsed_configs[key] = yaml.load(f)
+    return copy.deepcopy(_parsed_configs[key])
+
 
 def get_config(filename=None, **overrides):
     from .utils import _data, _data_out
@@ -32,16 +45,15 @@ def get_config(filename=None, **overrides):
             "The config file '{}' does not exist yet. "
             "Copy config_example.yaml to config.yaml and fill in details, "
             "as necessary.".format(filename))
-    with open(filename) as f:
-        config = yaml.load(f)
-        config.update(overrides)
-
-        sha1digest = hashlib.sha1(pickle.dumps(overrides)).digest()
-        if len(dict(**overrides)) == 0:
-            config['hash'] = 'default'
-        else:
-            config['hash'] = base64.encodestring(sha1digest)\
-                             .decode('ascii')[2:12]
+    config = _parse_config(filename)
+    config.update(overrides)
+
+    sha1digest = hashlib.sha1(pickle.dumps(overrides)).digest()
+    if len(dict(**overrides)) == 0:
+        config['hash'] = 'default'
+    else:
+        config['hash'] = base64.encodestring(sha1digest)\
+                         .decode('ascii')[2:12]
     if not os.path.isdir(_data_out('.', config=config)):
         os.mkdir(os.path.abspath(_data_out('.', config=config)))
         os.mkdir(os.path.abspath(_data_out('matches', config=config)))
@@ -22,15 +22,17 @@ from __future__ import print_function, absolute_import
 
 import os
 import sys
-import xlrd
+import glob
+import hashlib
 import numpy as np
 import pandas as pd
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
 import re
 import pycountry
 import logging
 from textwrap import dedent
+from functools import wraps
 from six.moves import reduce
 
 from .config import get_config
@@ -38,17 +40,93 @@ from .cleaning import (gather_fueltype_info, gather_set_info,
                        gather_technology_info, clean_powerplantname,
                        clean_technology)
 from .utils import (fill_geoposition, _data, _data_in, _data_out,
-                    correct_manually, config_filter)
+                    correct_manually, config_filter, set_categories,
+                    cache_format, to_list_if_string)
 from .heuristics import scale_to_net_capacities
+from .sources import source_registry
 from six import iteritems, string_types
 
 logger = logging.getLogger(__name__)
 text = str if sys.version_info >= (3, 0) else unicode
 cget = pycountry.countries.get
-net_caps = get_config()['display_net_caps']
-data_config = {}
+# kept for backwards compatibility, see powerplantmatching.sources
+data_config = source_registry
+
+# config entries changing the output of the importers
+importer_config_keys = ['target_columns', 'target_countries',
+                        'target_fueltypes', 'target_technologies',
+                        'target_sets', 'matching_sources',
+                        'GEO_minimum_capacity']
+_importer_cache = {}
+
+
+def _importer_key(name, version, kwargs, config):
+    files = to_list_if_string(data_config[name]['source_file']) + \
+        [_data('manual_corrections.csv')]
+    stamps = [(f, os.path.getmtime(f), os.path.getsize(f))
+              for f in files if os.path.exists(f)]
+    conf = [(k, config.get(k)) for k in importer_config_keys]
+    args = sorted((k, v) for k, v in kwargs.items() if k != 'config')
+    return hashlib.sha1(repr((name, version, stamps, conf, args))
+                        .encode('utf-8')).hexdigest()[:12]
+
+
+def cached_importer(name, version=1,
+                    bypass=('raw', 'rawEU', 'rawDE', 'update')):
+    """
+    Decorator caching the output of the importer of the data source `name`.
 
+    The cache is keyed on the modification time and size of the source files
+    in data_config[name]['source_file'] and of the manual corrections, on the
+    importer `version`, on the keyword arguments and on the config entries in
+    importer_config_keys. Repeated calls are served from memory, other
+    sessions read the parquet files in data/out/importers if
+    config.yaml/cache_format is 'parquet'. Calls with positional arguments or
+    with any of the `bypass` arguments set are not cached.
 
+    Parameters
+    ----------
+    name : str
+        Name of the data source in data_config
+    version : int, default 1
+        Version of the importer, increase it when changing the importer
+    """
+    def decorator(read_function):
+        @wraps(read_function)
+        def wrapper(*args, **kwargs):
+            if args or any(kwargs.get(k) for k in bypass):
+                return read_function(*args, **kwargs)
+            if kwargs.get('config') is None:
+                kwargs['config'] = get_config()
+            key = _importer_key(name, version, kwargs, kwargs['config'])
+            if key not in _importer_cache:
+                _importer_cache[key] = _read_importer_cache(
+                        name, key, read_function, kwargs)
+            return _importer_cache[key].copy()
+        return wrapper
+    return decorator
+
+
+def _read_importer_cache(name, key, read_function, kwargs):
+    if cache_format(kwargs['config']) != 'parquet':
+        return read_function(**kwargs)
+    fn = _data_out('../importers/{}_{}.parquet'.format(name, key))
+    if os.path.exists(fn):
+        logger.info("Reading cached data of '{}'.".format(name))
+        return pd.read_parquet(fn)
+    df = read_function(**kwargs)
+    if not os.path.isdir(os.path.dirname(fn)):
+        os.makedirs(os.path.dirname(fn))
+    for old in glob.glob(_data_out('../importers/{}_*.parquet'.format(name))):
+        os.remove(old)
+    try:
+        df.to_parquet(fn)
+    except (ValueError, TypeError) as e:
+        logger.warning("Could not cache the data of '{}': {}".format(name, e))
+    return df
+
+
+@cached_importer('OPSD')
 def OPSD(rawEU=False, rawDE=False,
          statusDE=['operating', 'reserve', 'special_case'],
          config=None):
@@ -142,22 +220,94 @@ def OPSD(rawEU=False, rawDE=False,
             .pipe(clean_technology)
             .pipe(scale_to_net_capacities,
                   (not data_config['OPSD']['net_capacity']))
-
-            )
+            .pipe(set_categories, config=config))
 
 
-data_config['OPSD'] = {'read_function': OPSD,
-                       'reliability_score': 5,
-                       'net_capacity': True,
-                       'source_file':
-                           [_data_in('conventional_power_plants_EU.csv'),
-                            _data_in('conventional_power_plants_DE.csv')]}
+# columns of the GEO database read by GEO(), leading columns first
+geo_columns = ['status_of_plant_itf', 'country', 'type',
+               'design_capacity_mwe_nbr', 'GEO_Assigned_Identification_Number',
+               'name', 'Type_of_Plant_rng1', 'Type_of_Fuel_rng1_Primary',
+               'Type_of_Fuel_rng2_Secondary', 'Year_Project_Commissioned',
+               'Year_Rng1_yr1', 'longitude_start', 'latitude_start']
+# raw GEO types which can result in the target fueltypes, see
+# gather_fueltype_info
+geo_fueltypes = {'Natural Gas': ['Gas'], 'Hard Coal': ['Coal'],
+                 'Lignite': ['Coal']}
 
 
+def geo_query(config):
+    """
+    Return the WHERE clause and its parameters selecting the plants of the
+    GEO database in config['target_countries'] and config['target_fueltypes']
+    with a design capacity of at least config['GEO_minimum_capacity'].
+    """
+    countries = list(config['target_countries'])
+    types = set(config['target_fueltypes'])
+    for fueltype in config['target_fueltypes']:
+        types.update(geo_fueltypes.get(fueltype, []))
+    types = sorted(types)
+    where = ("status_of_plant_itf == 'Operating Fully' AND "
+             "design_capacity_mwe_nbr > 0 AND "
+             "design_capacity_mwe_nbr >= ? AND "
+             "country IN ({}) AND "
+             "(type IN ({}){})"
+             .format(', '.join('?' * len(countries)),
+                     ', '.join('?' * len(types)),
+                     # fuels containing these keywords result in 'Lignite'
+                     " OR Type_of_Fuel_rng1_Primary LIKE '%lignite%'"
+                     " OR Type_of_Fuel_rng1_Primary LIKE '%brown%'"
+                     if 'Lignite' in types else ''))
+    params = [config.get('GEO_minimum_capacity') or 0] + countries + types
+    return where, params
+
+
+def _indexed_geo_database():
+    """
+    Return the path of a copy of the GEO database in data/out, carrying a
+    covering index for the query of GEO(). The copy is renewed whenever the
+    source file is newer. The source file in data/in is not modified, since
+    its modification time marks updates of the data for cached_importer()
+    and correct_manually(). Falls back to the source file if the copy can
+    not be created.
+    """
+    import shutil
+    import sqlite3
+    source = data_config['GEO']['source_file']
+    fn = _data_out('../' + os.path.basename(source))
+    if (os.path.exists(fn) and
+            os.path.getmtime(fn) >= os.path.getmtime(source)):
+        return fn
+    logger.info("Indexing a copy of the GEO database in {}".format(fn))
+    tmp = fn + '.tmp'
+    try:
+        shutil.copyfile(source, tmp)
+        db = sqlite3.connect(tmp)
+        try:
+            with db:
+                db.execute("CREATE INDEX IF NOT EXISTS geo_importer "
+                           "ON powerplants ({})"
+                           .format(', '.join(geo_columns)))
+        finally:
+            db.close()
+        if os.path.exists(fn):
+            os.remove(fn)
+        os.rename(tmp, fn)
+    except (IOError, OSError, sqlite3.Error) as e:
+        logger.warning("Could not index a copy of the GEO database, reading "
+                       "it without index: {}".format(e))
+        return source
+    return fn
+
+
+@cached_importer('GEO', version=2)
 def GEO(raw=False, config=None):
     """
     Importer for the GEO database.
 
+    The plants are filtered according to the config in the SQL query, see
+    geo_query(). The query runs on an indexed copy of the database, see
+    _indexed_geo_database().
+
     Parameters
     ----------
     raw : Boolean, default False
@@ -167,56 +317,60 @@ def GEO(raw=False, config=None):
         e.g. powerplantmatching.config.get_config(target_countries='Italy'),
         defaults to powerplantmatching.config.get_config()
     """
+    import sqlite3
     if config is None:
         config = get_config()
 
-    def read_globalenergyobservatory():
-        import pandas as pd
-        import sqlite3
-
-        db = sqlite3.connect(data_config['GEO']['source_file'])
-
+    columns = ["projectID", "Name", "Fueltype", "Technology",
+               "FuelClassification1", "FuelClassification2", "Country",
+               "Capacity", "YearCommissioned", "Retrofit", "lon", "lat"]
+    db = sqlite3.connect(data_config['GEO']['source_file'] if raw
+                         else _indexed_geo_database())
+    try:
+        if raw:
+            cur = db.execute(
+                "select"
+                "   GEO_Assigned_Identification_Number, "
+                "   name, type, Type_of_Plant_rng1 , "
+                "   Type_of_Fuel_rng1_Primary, Type_of_Fuel_rng2_Secondary,"
+                "   country, design_capacity_mwe_nbr, "
+                "   Year_Project_Commissioned, Year_Rng1_yr1, "
+                "   CAST(longitude_start AS REAL) as lon,"
+                "   CAST(latitude_start AS REAL) as lat "
+                "from"
+                "   powerplants "
+                "where"
+                "   status_of_plant_itf=='Operating Fully' and"
+                "   design_capacity_mwe_nbr > 0"
+            )
+            return pd.DataFrame(cur.fetchall(), columns=columns)
+        where, params = geo_query(config)
+        # the commissioning year is given by the first four digits of
+        # Year_Project_Commissioned, else the year of the first retrofit
+        retrofit = "CAST(NULLIF(Year_Rng1_yr1, '') AS REAL)"
+        year = ("CASE WHEN trim(Year_Project_Commissioned) "
+                "   GLOB '[0-9][0-9][0-9][0-9]*' "
+                "THEN CAST(substr(trim(Year_Project_Commissioned), 1, 4) "
+                "   AS REAL) END")
         cur = db.execute(
-            "select"
-            "   GEO_Assigned_Identification_Number, "
-            "   name, type, Type_of_Plant_rng1 , Type_of_Fuel_rng1_Primary, "
-            "   Type_of_Fuel_rng2_Secondary,"
-            "   country, design_capacity_mwe_nbr, "
-            "   Year_Project_Commissioned, Year_Rng1_yr1, "
-            "   CAST(longitude_start AS REAL) as lon,"
-            "   CAST(latitude_start AS REAL) as lat "
-            "from"
-            "   powerplants "
-            "where"
-            "   status_of_plant_itf=='Operating Fully' and"
-            "   design_capacity_mwe_nbr > 0"
-        )
-
-        return pd.DataFrame(cur.fetchall(),
-                            columns=["projectID", "Name", "Fueltype",
-                                     "Technology", "FuelClassification1",
-                                     "FuelClassification2", "Country",
-                                     "Capacity", "YearCommissioned",
-                                     "Retrofit", "lon", "lat"])
-    geo = read_globalenergyobservatory()
-    if raw:
-        return geo
-    geo = (geo.assign(Retrofit=geo.Retrofit.astype(float),
-                      projectID='GEO' + geo.projectID.astype(str)))
-    # Necessary to do this in two steps, since Retrofit cannot be assigned to
-    # itself (see above) and re-used for YearCommissioned in one step.
-    geo = geo.assign(YearCommissioned=(
-                             geo.YearCommissioned.astype(text)
-                             .str.replace("[a-zA-Z]", '')
-                             .str.replace("[^0-9.]", " ")
-                             .str.split(' ')
-                             .str[0].replace('', np.nan)
-                             .str.slice(0, 4)
-                             .astype(float)
-                             .fillna(geo.Retrofit)))
-    geo = geo.assign(Retrofit=geo.Retrofit.fillna(geo.YearCommissioned))
+            "SELECT"
+            "   'GEO' || GEO_Assigned_Identification_Number, "
+            "   name, type, Type_of_Plant_rng1, Type_of_Fuel_rng1_Primary, "
+            "   Type_of_Fuel_rng2_Secondary, country, "
+            "   design_capacity_mwe_nbr, "
+            "   coalesce({year}, {retrofit}), "
+            "   coalesce({retrofit}, {year}), "
+            "   CAST(longitude_start AS REAL), "
+            "   CAST(latitude_start AS REAL) "
+            "FROM powerplants "
+            "WHERE {where}".format(year=year, retrofit=retrofit, where=where),
+            params)
+        geo = pd.DataFrame(cur.fetchall(), columns=columns)
+    finally:
+        db.close()
+    geo = geo.assign(YearCommissioned=geo.YearCommissioned.astype(float),
+                     Retrofit=geo.Retrofit.astype(float))
     return (geo
-            .loc[lambda df: df.Country.isin(config['target_countries'])]
             .replace({col: {'Gas': 'Natural Gas'}
                       for col in {'Fueltype', 'FuelClassification1',
                                   'FuelClassification2'}})
@@ -225,21 +379,15 @@ def GEO(raw=False, config=None):
                   config=config)
             .pipe(gather_set_info)
             .pipe(config_filter, name='GEO', config=config)
-            .pipe(clean_powerplantname)
+            .pipe(clean_powerplantname, config=config)
             .pipe(clean_technology, generalize_hydros=True)
             .pipe(scale_to_net_capacities,
                   (not data_config['GEO']['net_capacity']))
-            .pipe(correct_manually, 'GEO', config=config))
-
-
-data_config['GEO'] = {'read_function': GEO,
-                      'aggregated_units': False,
-                      'reliability_score': 3,
-                      'net_capacity': False,
-                      'source_file': _data_in('global_energy_observatory'
-                                              '_power_plants.sqlite')}
+            .pipe(correct_manually, 'GEO', config=config)
+            .pipe(set_categories, config=config))
 
 
+@cached_importer('CARMA')
 def CARMA(raw=False, config=None):
     """
     Importer for the Carma database.
@@ -287,7 +435,7 @@ def CARMA(raw=False, config=None):
                                     'BGAS': 'Bioenergy',
                                     'BSOL': 'Bioenergy',
                                     'OTH': 'Other'}))
-            .pipe(clean_powerplantname)
+            .pipe(clean_powerplantname, config=config)
             .drop_duplicates()
             .pipe(config_filter, name='CARMA', config=config)
             .pipe(gather_technology_info, config=config)
@@ -295,15 +443,11 @@ def CARMA(raw=False, config=None):
             .pipe(clean_technology)
             .pipe(scale_to_net_capacities,
                   (not data_config['CARMA']['net_capacity']))
-            .pipe(correct_manually, 'CARMA', config=config))
-
-
-data_config['CARMA'] = {'read_function': CARMA,
-                        'reliability_score': 1, 'net_capacity': False,
-                        'source_file':
-                            _data_in('Full_CARMA_2009_Dataset_1.csv')}
+            .pipe(correct_manually, 'CARMA', config=config)
+            .pipe(set_categories, config=config))
 
 
+@cached_importer('IWPDCY')
 def IWPDCY(config=None):
     """
     This data is not yet available. Was extracted manually from
@@ -326,13 +470,8 @@ def IWPDCY(config=None):
             .dropna(subset=['Capacity'])
             .pipe(config_filter, name='IWPDY', config=config)
             .pipe(gather_set_info)
-            .pipe(correct_manually, 'IWPDCY', config=config))
-
-
-data_config['IWPDCY'] = {'read_function': IWPDCY,
-                         'aggregated_units': True,
-                         'reliability_score': 3,
-                         'source_file': _data_in('IWPDCY.csv')}
+            .pipe(correct_manually, 'IWPDCY', config=config)
+            .pipe(set_categories, config=config))
 
 
 def Capacity_stats(raw=False, level=2, config=None, **selectors):
@@ -408,6 +547,7 @@ def Capacity_stats_factsheet(config=None):
               .loc[lambda df: df.Fueltype.isin(config['target_fueltypes'])])
 
 
+@cached_importer('GPD')
 def GPD(raw=False, filter_other_dbs=True, config=None):
     """
     Importer for the `Global Power Plant Database`.
@@ -451,19 +591,12 @@ def GPD(raw=False, filter_other_dbs=True, config=None):
                                     'Biomass': 'Bioenergy',
                                     'Gas': 'Natural Gas',
                                     'Wave and Tidal': 'Other'}))
-            .pipe(clean_powerplantname)
+            .pipe(clean_powerplantname, config=config)
             .pipe(config_filter, name='GPD', config=config)
             .pipe(gather_technology_info, config=config)
             .pipe(gather_set_info)
             .pipe(correct_manually, 'GPD', config=config)
-            )
-
-
-data_config['GPD'] = {'read_function': GPD,
-                      'aggregated_units': False,
-                      'reliability_score':  3,
-                      'source_file': _data_in('global_power_'
-                                              'plant_database.csv')}
+            .pipe(set_categories, config=config))
 
 
 def WRI(**kwargs):
@@ -471,6 +604,7 @@ def WRI(**kwargs):
     return GPD(**kwargs)
 
 
+@cached_importer('ESE')
 def ESE(raw=False, config=None):
     """
     Importer for the ESE database.
@@ -503,6 +637,7 @@ def ESE(raw=False, config=None):
         /path/to/powerplantmatching/data/in/.
         ''').format(path)
 
+    import xlrd
     book = xlrd.open_workbook(path)
     sheet = book.sheets()[0]
     col_longitude = sheet.row_values(0).index('Longitude')
@@ -529,20 +664,171 @@ def ESE(raw=False, config=None):
                             data['Commissioning Date']).year)
             [lambda df: (df.Status == 'Operational') &
                         (df.Country.isin(config['target_countries']))]
-            .pipe(clean_powerplantname)
+            .pipe(clean_powerplantname, config=config)
             .pipe(clean_technology, generalize_hydros=True)
             .replace(dict(Fueltype={u'Electro-chemical': 'Battery',
                                     u'Pumped Hydro Storage': 'Hydro'}))
             .pipe(config_filter, name='ESE', config=config)
-            .pipe(correct_manually, 'ESE', config=config))
+            .pipe(correct_manually, 'ESE', config=config)
+            .pipe(set_categories, config=config))
+
+
+# endpoint of the ENTSO-E Transparency platform, may be overridden by the
+# config entry 'entsoe_url', e.g. for replaying responses with
+# entsoe_stub_server.py
+entsoe_url = 'https://transparency.entsoe.eu/api'
+
+
+def _entsoe_response_file(domain):
+    return _data_out('../entsoe/{}.xml'.format(domain))
+
+
+def fetch_entsoe(domains, entsoe_token, use_saved_responses=False,
+                 config=None):
+    """
+    Fetch the installed generation units (document type A71) of the given
+    bidding domains from the ENTSO-E Transparency platform. The requests
+    share one session and run concurrently with at most
+    config['entsoe_connections'] open connections, failed requests are
+    retried config['entsoe_retries'] times with an exponential backoff. The
+    raw responses are streamed to data/out/entsoe/<domain>.xml, including
+    the ones of domains without data.
+
+    Parameters
+    ----------
+    domains : list of str
+        EIC codes of the bidding domains
+    entsoe_token : str
+        Security token of the ENTSO-E Transparency platform
+    use_saved_responses : Boolean, default False
+        Whether to reuse the saved responses instead of requesting them again
+    config : dict, default None
+        Add custom specific configuration, defaults to
+        powerplantmatching.config.get_config()
+
+    Returns
+    -------
+    dict of the response files by domain, see parse_entsoe()
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+    if config is None:
+        config = get_config()
+    connections = config.get('entsoe_connections', 4)
+    retry = Retry(total=config.get('entsoe_retries', 3), backoff_factor=1.,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=connections,
+                          pool_maxsize=connections, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def fetch(domain):
+        fn = _entsoe_response_file(domain)
+        if use_saved_responses and os.path.exists(fn):
+            return fn
+        logger.info("Fetching power plants for domain %s", domain)
+        # https://transparency.entsoe.eu/content/static_content/
+        # Static%20content/web%20api/Guide.html_generation_domain
+        ret = session.get(config.get('entsoe_url', entsoe_url),
+                          params=dict(securityToken=entsoe_token,
+                                      documentType='A71',
+                                      processType='A33',
+                                      In_Domain=domain,
+                                      periodStart='201512312300',
+                                      periodEnd='201612312300'),
+                          timeout=300, stream=True)
+        with open(fn + '.part', 'wb') as f:
+            for chunk in ret.iter_content(chunk_size=2**16):
+                f.write(chunk)
+        ret.close()
+        # the API answers domains without data with 400, other failed
+        # responses are not kept for use_saved_responses
+        if ret.status_code not in (200, 400):
+            return fn + '.part'
+        if os.path.exists(fn):
+            os.remove(fn)
+        os.rename(fn + '.part', fn)
+        return fn
+
+    if not os.path.isdir(os.path.dirname(_entsoe_response_file(''))):
+        os.makedirs(os.path.dirname(_entsoe_response_file('')))
+    domains = list(pd.unique(np.asarray(domains, dtype=object)))
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            return dict(zip(domains, executor.map(fetch, domains)))
+    finally:
+        session.close()
+
+
+class _EscapedAmpersands(object):
+    """
+    Binary file wrapper escaping the ampersands which do not start an entity.
+    """
+    bare_ampersand = re.compile(
+            br'&(?!(?:amp|lt|gt|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);)')
+
+    def __init__(self, f):
+        self.f = f
+        self.tail = b''
 
+    def read(self, size=-1):
+        while True:
+            chunk = self.f.read(size)
+            data, self.tail = self.tail + chunk, b''
+            # hold back an ampersand which might start an entity
+            amp = data.rfind(b'&', max(0, len(data) - 10))
+            if chunk and amp >= 0 and b';' not in data[amp:]:
+                data, self.tail = data[:amp], data[amp:]
+            if data or not chunk:
+                return self.bare_ampersand.sub(b'&amp;', data)
 
-data_config['ESE'] = {'read_function': ESE,
-                      'reliability_score': 6,
-                      'source_file': _data_in('projects.xls')}
 
+# fields of the TimeSeries in ENTSO-E A71 documents
+entsoe_fields = ['registeredResource.name', 'registeredResource.mRID',
+                 'voltage_PowerSystemResources.highVoltageLimit', 'psrType',
+                 'quantity']
 
-def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
+
+def parse_entsoe(fn):
+    """
+    Decode an ENTSO-E A71 document (installed generation units) in a single
+    streaming pass, keeping only the current TimeSeries in memory. Unescaped
+    ampersands, as contained in some names returned by the API, are escaped
+    while reading.
+
+    Parameters
+    ----------
+    fn : str
+        Path of the document, see fetch_entsoe()
+
+    Returns
+    -------
+    generator of dicts with the keys in entsoe_fields, one per TimeSeries
+    """
+    with open(fn, 'rb') as f:
+        root = None
+        record = {}
+        for event, elem in ET.iterparse(_EscapedAmpersands(f),
+                                        events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event != 'end':
+                continue
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag in entsoe_fields:
+                record.setdefault(tag, elem.text)
+            elif tag == 'TimeSeries':
+                yield record
+                record = {}
+                root.clear()
+
+
+@cached_importer('ENTSOE')
+def ENTSOE(update=False, raw=False, entsoe_token=None,
+           use_saved_responses=False, config=None):
     """
     Importer for the list of installed generators provided by the ENTSO-E
     Trasparency Project. Geographical information is not given.
@@ -562,6 +848,9 @@ def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
         the ENTSO-E transparency platform
     entsoe_token: String
         Security token of the ENTSO-E Transparency platform
+    use_saved_responses : Boolean, Default False
+        Whether to reuse the responses saved by the last update, see
+        fetch_entsoe()
     config : dict, default None
         Add custom specific configuration,
         e.g. powerplantmatching.config.get_config(target_countries='Italy'),
@@ -590,29 +879,31 @@ def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
             def pycountry_try(c):
                 try:
                     return pycountry.countries.get(alpha_2=c).name
-                except KeyError:
+                except (KeyError, AttributeError):
                     return None
             if isinstance(l, string_types):
-                return filter(None, [pycountry_try(l)])
+                return list(filter(None, [pycountry_try(l)]))
             else:  # iterable
-                return filter(None, [pycountry_try(country) for country in l])
+                return list(filter(None, [pycountry_try(country)
+                                          for country in l]))
 
         domains = pd.read_csv(_data('in/entsoe-areamap.csv'), sep=';',
                               header=None)
         # Search for Country abbreviations in each Name
-        pattern = '|'.join(('(?i)'+x) for x in config['target_countries'])
+        pattern = '|'.join(config['target_countries'])
         domains = domains.assign(Country=domains[1]
-                                 .str.findall(pattern)
+                                 .str.findall(pattern, flags=re.I)
                                  .str.join(', '))
         found = (domains[1]
                  .replace('[0-9]', '', regex=True)
                  .str.split(' |,|\+|\-')
                  .apply(full_country_name).str.join(sep=', ')
-                 .str.findall(pattern)
+                 .str.findall(pattern, flags=re.I)
                  .str.join(sep=', ').str.strip())
         domains.Country = (domains.loc[:, 'Country'].fillna('')
                            .str.cat(found.fillna(''), sep=', ')
-                           .str.replace('^ ?, ?|, ?$', '').str.strip())
+                           .str.replace('^ ?, ?|, ?$', '', regex=True)
+                           .str.strip())
         domains.Country.replace('', np.NaN, inplace=True)
         domains.Country = (domains.loc[domains.Country.notnull(), 'Country']
                            .apply(lambda x:
@@ -641,53 +932,21 @@ def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
                  'B19': 'Wind Onshore',
                  'B20': 'Other'}
 
-        level1 = ['registeredResource.name', 'registeredResource.mRID']
-        level2 = ['voltage_PowerSystemResources.highVoltageLimit', 'psrType']
-        level3 = ['quantity']
-
-        def namespace(element):
-            m = re.match('\{.*\}', element.tag)
-            return m.group(0) if m else ''
-
-        def attribute(etree_sel):
-            return etree_sel.text
-
-        entsoe = pd.DataFrame()
-        for i in domains.index[domains.Country.notnull()]:
-            logger.info("Fetching power plants for domain %s (%s)",
-                        domains.loc[i, 0],
-                        domains.loc[i, 'Country'])
-
-            # https://transparency.entsoe.eu/content/static_content/
-            # Static%20content/web%20api/Guide.html_generation_domain
-            ret = requests.get('https://transparency.entsoe.eu/api',
-                               params=dict(securityToken=entsoe_token,
-                                           documentType='A71',
-                                           processType='A33',
-                                           In_Domain=domains.loc[i, 0],
-                                           periodStart='201512312300',
-                                           periodEnd='201612312300'))
-            try:
-                # Create an ElementTree object
-                etree = ET.fromstring(ret.content)
-            except ET.ParseError:
-                # hack for dealing with unencoded '&' in ENTSOE-API
-                etree = ET.fromstring(re.sub(r'&(?=[^;]){6}', r'&amp;',
-                                             ret.text).encode('utf-8'))
-            ns = namespace(etree)
-            df = pd.DataFrame(columns=level1+level2+level3+['Country'])
-            for arg in level1:
-                df[arg] = [attribute(e) for e in
-                           etree.findall('*/%s%s' % (ns, arg))]
-            for arg in level2:
-                df[arg] = [attribute(e) for e in
-                           etree.findall('*/*/%s%s' % (ns, arg))]
-            for arg in level3:
-                df[arg] = [attribute(e) for e in
-                           etree.findall('*/*/*/%s%s' % (ns, arg))]
+        domains = domains[domains.Country.notnull()]
+        responses = fetch_entsoe(domains[0], entsoe_token,
+                                 use_saved_responses=use_saved_responses,
+                                 config=config)
+        dfs = []
+        for i in domains.index:
+            df = pd.DataFrame(
+                    list(parse_entsoe(responses[domains.loc[i, 0]])),
+                    columns=entsoe_fields)
             df['Country'] = domains.loc[i, 'Country']
-            logger.info("Received data on %d power plants", len(df))
-            entsoe = entsoe.append(df, ignore_index=True)
+            logger.info("Received data on %d power plants for domain %s "
+                        "(%s)", len(df), domains.loc[i, 0],
+                        domains.loc[i, 'Country'])
+            dfs.append(df)
+        entsoe = pd.concat(dfs, ignore_index=True)
 
         if raw:
             return entsoe
@@ -720,7 +979,7 @@ def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
                                  'Wind Offshore': 'Offshore',
                                  'Wind Onshore': 'Onshore'}, regex=True),
                         Capacity=lambda df: pd.to_numeric(df.Capacity))
-                .pipe(clean_powerplantname)
+                .pipe(clean_powerplantname, config=config)
                 .pipe(fill_geoposition, use_saved_locations=True)
                 .pipe(config_filter, config=config)
                 .replace({'Capacity': {0.: np.nan}})
@@ -740,15 +999,11 @@ def ENTSOE(update=False, raw=False, entsoe_token=None, config=None):
             .pipe(config_filter, name='ENTSOE', config=config)
             .pipe(scale_to_net_capacities,
                   (not data_config['ENTSOE']['net_capacity']))
-            .pipe(correct_manually, 'ENTSOE', config=config))
-
-
-data_config['ENTSOE'] = {'read_function': ENTSOE,
-                         'reliability_score': 4,
-                         'net_capacity': True,
-                         'source_file': _data_in('entsoe_powerplants.csv')}
+            .pipe(correct_manually, 'ENTSOE', config=config)
+            .pipe(set_categories, config=config))
 
 
+@cached_importer('WEPP')
 def WEPP(raw=False, config=None):
     """
     Importer for the standardized WEPP (Platts, World Elecrtric Power
@@ -913,16 +1168,11 @@ def WEPP(raw=False, config=None):
             .pipe(config_filter, name='WEPP', config=config)
             .pipe(scale_to_net_capacities,
                   (not data_config['WEPP']['net_capacity']))
-            .pipe(correct_manually, 'WEPP', config=config))
-
-
-data_config['WEPP'] = {
-        'read_function': WEPP,
-        'reliability_score': 4,
-        'net_capacity': False,
-        'source_file': _data_in('platts_wepp.csv')}
+            .pipe(correct_manually, 'WEPP', config=config)
+            .pipe(set_categories, config=config))
 
 
+@cached_importer('UBA')
 def UBA(header=9, skipfooter=26, prune_wind=True, prune_solar=True,
         config=None):
     """
@@ -1013,17 +1263,11 @@ def UBA(header=9, skipfooter=26, prune_wind=True, prune_solar=True,
             .pipe(config_filter, name='UBA', config=config)
             .pipe(scale_to_net_capacities,
                   (not data_config['UBA']['net_capacity']))
-            .pipe(correct_manually, 'UBA', config=config))
-
-
-data_config['UBA'] = {
-        'read_function': UBA,
-        'aggregated_units': False,
-        'net_capacity': False,
-        'reliability_score': 5,
-        'source_file': _data_in('kraftwerke-de-ab-100-mw.xls')}
+            .pipe(correct_manually, 'UBA', config=config)
+            .pipe(set_categories, config=config))
 
 
+@cached_importer('BNETZA')
 def BNETZA(header=9, sheet_name='Gesamtkraftwerksliste BNetzA',
            prune_wind=True, prune_solar=True, raw=False,
            config=None):
@@ -1144,16 +1388,86 @@ def BNETZA(header=9, sheet_name='Gesamtkraftwerksliste BNetzA',
             .pipe(config_filter, name='BNETZA', config=config)
             .pipe(scale_to_net_capacities,
                   not data_config['BNETZA']['net_capacity'])
-            .pipe(correct_manually, 'BNETZA', config=config))
+            .pipe(correct_manually, 'BNETZA', config=config)
+            .pipe(set_categories, config=config))
 
 
-data_config['BNETZA'] = {'read_function': BNETZA, 'net_capacity': True,
-                         'reliability_score': 3,
-                         'source_file': _data_in('Kraftwerksliste_'
-                                                 '2017_2.xlsx')}
+# countries with a table in the OPSD renewables database
+opsd_vre_countries = ['DE', 'DK', 'CH']
+opsd_vre_technologies = {u'Connected unit': 'PV',
+                         u'Integrated unit': 'PV',
+                         u'Photovoltaics': 'PV',
+                         u'Photovoltaics ground': 'PV',
+                         u'Stand alone unit': 'PV',
+                         u'Onshore wind energy': 'Onshore',
+                         u'Offshore wind energy': 'Offshore'}
 
 
-def OPSD_VRE(config=None):
+def read_opsd_vre(country, fueltypes=None, year_range=None,
+                  chunksize=100000):
+    """
+    Read the units of one country from the OPSD renewables database in
+    chunks. The filters are applied in the SQL query, the commissioning year
+    is extracted in SQL as well.
+
+    Parameters
+    ----------
+    country : str
+        Two-letter country code, one of opsd_vre_countries
+    fueltypes : list, default None
+        Read only units with these values of 'energy_source_level_2'
+    year_range : tuple, default None
+        Read only units commissioned in (first, last) year, inclusively
+    chunksize : int, default 100000
+        Number of units per chunk
+
+    Yields
+    ------
+    chunk : pd.DataFrame
+        Units with typed columns 'YearCommissioned', 'Fueltype',
+        'Technology', 'Capacity', 'lat', 'lon' and 'projectID'
+    """
+    import sqlite3
+    if country not in opsd_vre_countries:
+        raise NotImplementedError(
+                "The country '{0}' is not supported yet.".format(country))
+    year = ("CASE WHEN commissioning_date GLOB '[0-9][0-9][0-9][0-9]*' "
+            "THEN CAST(substr(commissioning_date, 1, 4) AS INTEGER) END")
+    where, params = [], []
+    if fueltypes is not None:
+        where.append('energy_source_level_2 IN ({})'
+                     .format(', '.join('?' * len(fueltypes))))
+        params += list(fueltypes)
+    if year_range is not None:
+        where.append('{} BETWEEN ? AND ?'.format(year))
+        params += [int(y) for y in year_range]
+    # the projectID is the position of the unit in the whole table, which
+    # does not depend on the filters nor on gaps in the rowids
+    query = ("SELECT {year} AS YearCommissioned, "
+             "   energy_source_level_2 AS Fueltype, "
+             "   technology AS Technology, "
+             "   NULLIF(electrical_capacity, '') AS Capacity, "
+             "   NULLIF(lat, '') AS lat, "
+             "   NULLIF(lon, '') AS lon, "
+             "   'OPSD-VRE_{country}_' || position AS projectID "
+             "FROM (SELECT *, ROW_NUMBER() OVER (ORDER BY rowid) - 1 "
+             "      AS position FROM renewable_power_plants_{country}) "
+             "{where} ORDER BY position"
+             .format(year=year, country=country,
+                     where=('WHERE ' + ' AND '.join(where)) if where else ''))
+    dtypes = {'YearCommissioned': float, 'Capacity': float, 'lat': float,
+              'lon': float}
+    db = sqlite3.connect(_data_in('renewable_power_plants.sqlite'))
+    try:
+        for chunk in pd.read_sql_query(query, db, params=params,
+                                       chunksize=chunksize):
+            yield chunk.astype(dtypes)
+    finally:
+        db.close()
+
+
+def OPSD_VRE(config=None, countries=None, fueltypes=None, year_range=None,
+             chunksize=None):
     """
     Importer for the OPSD (Open Power Systems Data) renewables (VRE)
     database.
@@ -1168,77 +1482,51 @@ def OPSD_VRE(config=None):
         Add custom specific configuration,
         e.g. powerplantmatching.config.get_config(target_countries='Italy'),
         defaults to powerplantmatching.config.get_config()
+    countries : list, default None
+        Countries to read, restricted to config['target_countries']
+    fueltypes : list, default None
+        Fueltypes to read, restricted to config['target_fueltypes']
+    year_range : tuple, default None
+        Read only units commissioned in (first, last) year, inclusively
+    chunksize : int, default None
+        If given, return an iterator over chunks of this many units instead
+        of one DataFrame, e.g. for heuristics.aggregate_VRE_by_commyear
     """
     if config is None:
         config = get_config()
-
-    def read_opsd_res(country):
-        import pandas as pd
-        import sqlite3
-        db = sqlite3.connect(_data_in('renewable_power_plants.sqlite'))
-        if country == 'CH':
-            cur = db.execute(
-                    "SELECT"
-                    "   substr(commissioning_date,1,4), "
-                    "   energy_source_level_2, technology, "
-                    "   electrical_capacity, lat, lon "
-                    "FROM"
-                    "   renewable_power_plants_CH "
-            )
-        elif country == 'DE':
-            cur = db.execute(
-                    "SELECT"
-                    "   substr(commissioning_date,1,4), "
-                    "   energy_source_level_2, technology, "
-                    "   electrical_capacity, lat, lon "
-                    "FROM"
-                    "   renewable_power_plants_DE "
-                    # "AND NOT"
-                    # "   comment LIKE '%R_%'"
-            )
-        elif country == 'DK':
-            cur = db.execute(
-                    "SELECT"
-                    "   substr(commissioning_date,1,4), "
-                    "   energy_source_level_2, technology, "
-                    "   electrical_capacity, lat, lon "
-                    "FROM"
-                    "   renewable_power_plants_DK "
-            )
-        else:
-            raise NotImplementedError(
-                    "The country '{0}' is not supported yet.".format(country))
-
-        df = pd.DataFrame(cur.fetchall(),
-                          columns=['YearCommissioned', 'Fueltype',
-                                   'Technology', 'Capacity', 'lat', 'lon'])
-        df.loc[:, 'Country'] = pycountry.countries.get(alpha_2=country).name
-        df.loc[:, 'projectID'] = pd.Series(
-                ['OPSD-VRE_{}_{}'.format(country, i) for i in df.index])
-        return df
-
-    df = pd.concat((read_opsd_res(r) for r in ['DE', 'DK', 'CH']),
-                   ignore_index=True)
-    df = (df.assign(Retrofit=df.YearCommissioned,
-                    Country=df.Country.str.title(),
+    if countries is None:
+        countries = config['target_countries']
+    countries = [c for c in countries if c in config['target_countries']]
+    if fueltypes is None:
+        fueltypes = config['target_fueltypes']
+    fueltypes = [f for f in fueltypes if f in config['target_fueltypes']]
+
+    def read_chunks():
+        for code in opsd_vre_countries:
+            country = pycountry.countries.get(alpha_2=code).name.title()
+            if country not in countries:
+                continue
+            for chunk in read_opsd_vre(code, fueltypes, year_range,
+                                       chunksize or 100000):
+                chunk = chunk.assign(
+                    Country=country,
+                    Retrofit=chunk.YearCommissioned,
                     File='renewable_power_plants.sqlite',
-                    Set='PP')
-            .replace({'NaT': np.NaN,
-                      None: np.NaN,
-                      '': np.NaN}))
-    for col in ['YearCommissioned', 'Retrofit', 'Capacity', 'lat', 'lon']:
-        df.loc[:, col] = df[col].astype(np.float)
-    d = {u'Connected unit': 'PV',
-         u'Integrated unit': 'PV',
-         u'Photovoltaics': 'PV',
-         u'Photovoltaics ground': 'PV',
-         u'Stand alone unit': 'PV',
-         u'Onshore wind energy': 'Onshore',
-         u'Offshore wind energy': 'Offshore'}
-    df.Technology.replace(d, inplace=True)
-    return (df
-            .pipe(config_filter, config=config)
-            .drop('Name', axis=1))
+                    Set='PP',
+                    Technology=chunk.Technology.replace(
+                        opsd_vre_technologies))
+                yield (chunk.pipe(config_filter, config=config)
+                            .drop('Name', axis=1))
+
+    if chunksize is not None:
+        return (chunk.pipe(set_categories, config=config)
+                for chunk in read_chunks())
+    chunks = list(read_chunks())
+    if not chunks:
+        chunks = [pd.DataFrame(columns=config['target_columns'])
+                  .drop('Name', axis=1)]
+    return (pd.concat(chunks, ignore_index=True)
+            .pipe(set_categories, config=config))
 
 
 def IRENA_stats(config=None):
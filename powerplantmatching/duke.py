@@ -17,14 +17,88 @@
 from __future__ import absolute_import, print_function
 import logging
 import os
+import re
+import atexit
+import threading
 from os.path import dirname
 import subprocess as sub
 import shutil
 import tempfile
 import pandas as pd
-import numpy as np
+from .config import get_config
 logger = logging.getLogger(__name__)
 
+duke_bin_dir = os.path.join(dirname(os.path.realpath(__file__)), '..',
+                            'duke_binaries')
+# line written by DukeServer.java after each finished run
+END_OF_RUN = '__END_OF_DUKE_RUN__'
+_server = {'process': None, 'pid': None, 'lock': threading.Lock()}
+
+
+def _duke_classpath():
+    return os.pathsep.join([os.path.join(duke_bin_dir, r)
+                            for r in os.listdir(duke_bin_dir)
+                            if r.endswith('.jar')])
+
+
+def start_duke_server():
+    """
+    Start a long-lived java process running duke_binaries/DukeServer.java,
+    which executes subsequent duke runs without starting a new JVM. The
+    server is started automatically by duke() if 'matching_backend' is set to
+    'duke-server' in the config and stopped at exit. Requires java >= 11.
+    """
+    process = _server['process']
+    if (process is not None and process.poll() is None
+            and _server['pid'] == os.getpid()):
+        return process
+    logger.info('Starting duke server')
+    process = sub.Popen(['java', '-Dfile.encoding=UTF-8',
+                         '-cp', _duke_classpath(),
+                         os.path.join(duke_bin_dir, 'DukeServer.java')],
+                        stdin=sub.PIPE, stdout=sub.PIPE,
+                        universal_newlines=True)
+    _server.update(process=process, pid=os.getpid())
+    return process
+
+
+def stop_duke_server():
+    """
+    Stop the duke server started by start_duke_server(), if running in this
+    process.
+    """
+    process = _server['process']
+    if process is None or _server['pid'] != os.getpid():
+        return
+    if process.poll() is None:
+        logger.info('Stopping duke server')
+        # the server terminates at the end of its input
+        process.stdin.close()
+        process.wait()
+    _server.update(process=None, pid=None)
+
+
+atexit.register(stop_duke_server)
+
+
+def _run_on_duke_server(args):
+    """
+    Pass the command line arguments of a single duke run to the duke server
+    and return its error output.
+    """
+    with _server['lock']:
+        process = start_duke_server()
+        process.stdin.write('\t'.join(args) + '\n')
+        process.stdin.flush()
+        output = []
+        for line in iter(process.stdout.readline, ''):
+            if line.rstrip('\n') == END_OF_RUN:
+                return ''.join(output)
+            output.append(line)
+        _server.update(process=None, pid=None)
+        raise RuntimeError("duke server terminated unexpectedly: {}"
+                           .format(''.join(output)))
+
 
 def add_geoposition_for_duke(df):
     """
@@ -32,18 +106,16 @@ def add_geoposition_for_duke(df):
     which concats the latitude and longitude of the powerplant in a string
 
     """
-    if not df.loc[:, ['lat', 'lon']].isnull().all().all():
-        df.loc[df.lat.notnull(), 'Geoposition'] = (
-                df[df.lat.notnull()].lat.apply(str)
-                .str.cat(df[df.lat.notnull()].lon.apply(str), sep=','))
-        return df
-    else:
-        df.loc[:, 'Geoposition'] = np.NaN
-        return df
+    located = df.lat.notnull() & df.lon.notnull()
+    df.loc[:, 'Geoposition'] = (df.lat.astype(float).astype(str) + ',' +
+                                df.lon.astype(float).astype(str)
+                                ).where(located)
+    return df
 
 
 def duke(datasets, labels=['one', 'two'], singlematch=False,
-         showmatches=False, keepfiles=False, showoutput=False):
+         showmatches=False, keepfiles=False, showoutput=False,
+         blocking=False, config=None):
     """
     Run duke in different modes (Deduplication or Record Linkage Mode) to
     either locate duplicates in one database or find the similar entries in two
@@ -64,26 +136,55 @@ def duke(datasets, labels=['one', 'two'], singlematch=False,
         the second named dataset.
     keepfiles : boolean, default False
         If true, do not delete temporary files
+    blocking : boolean or str, default False
+        Only compare records sharing the Country and a compatible Fueltype or
+        lying close to each other ('country' or True) or only neighbouring
+        records if located ('geo'), see powerplantmatching.linkage.link().
+        Only supported by the python backend.
+    config : dict, default None
+        Add custom specific configuration, the key 'matching_backend' selects
+        between the java application started for each run ('duke'), a
+        persistent java process reused across runs ('duke-server', see
+        start_duke_server()) and the native python engine ('python', see
+        powerplantmatching.linkage), defaults to
+        powerplantmatching.config.get_config()
     """
+    if config is None:
+        config = get_config()
+
+    backend = config.get('matching_backend', 'duke')
+    if backend == 'python':
+        from .linkage import link
+        return link(datasets, labels=labels, singlematch=singlematch,
+                    blocking=blocking)
+    if blocking:
+        logger.warning("Blocking is only supported by the python matching "
+                       "backend, comparing all records with duke.")
 
     dedup = isinstance(datasets, pd.DataFrame)
     if dedup:
         # Deduplication mode
-        config = "Deleteduplicates.xml"
+        duke_config = "Deleteduplicates.xml"
         datasets = [datasets]
     else:
-        config = "Comparison.xml"
+        duke_config = "Comparison.xml"
 
-    duke_bin_dir = os.path.join(dirname(os.path.realpath(__file__)), '..',
-                                'duke_binaries')
-    os.environ['CLASSPATH'] = \
-        os.pathsep.join([os.path.join(duke_bin_dir, r)
-                        for r in os.listdir(duke_bin_dir)])
+    server = backend == 'duke-server'
+    if not server:
+        os.environ['CLASSPATH'] = _duke_classpath()
     tmpdir = tempfile.mkdtemp()
 
     try:
-        shutil.copyfile(os.path.join(dirname(__file__), "..", "data", config),
-                        os.path.join(tmpdir, "config.xml"))
+        with open(os.path.join(dirname(__file__), "..", "data",
+                               duke_config)) as f:
+            xml = f.read()
+        if server:
+            # the server does not run in tmpdir, so refer to absolute paths
+            xml = re.sub(r'value="(file\d+\.csv)"',
+                         lambda m: 'value="{}"'.format(
+                                 os.path.join(tmpdir, m.group(1))), xml)
+        with open(os.path.join(tmpdir, "config.xml"), 'w') as f:
+            f.write(xml)
 
         logger.debug("Comparing files: %s", ", ".join(labels))
 
@@ -98,8 +199,7 @@ def duke(datasets, labels=['one', 'two'], singlematch=False,
             if n == 1:
                 df.index -= shift_by
 
-        args = ['java', '-Dfile.encoding=UTF-8', 'no.priv.garshol.duke.Duke',
-                '--linkfile=linkfile.txt']
+        args = ['--linkfile=' + os.path.join(tmpdir, 'linkfile.txt')]
         if singlematch:
             args.append('--singlematch')
         if showmatches:
@@ -107,14 +207,20 @@ def duke(datasets, labels=['one', 'two'], singlematch=False,
             stdout = sub.PIPE
         else:
             stdout = None
-        args.append('config.xml')
-
-        run = sub.Popen(args, stderr=sub.PIPE, cwd=tmpdir, stdout=stdout,
-                        universal_newlines=True)
-        _, stderr = run.communicate()
+        args.append(os.path.join(tmpdir, 'config.xml'))
 
-        if showmatches:
-            print(_)
+        if server:
+            # matches are shown on the stderr of the server
+            stderr = _run_on_duke_server(args)
+        else:
+            run = sub.Popen(['java', '-Dfile.encoding=UTF-8',
+                             'no.priv.garshol.duke.Duke'] + args,
+                            stderr=sub.PIPE, cwd=tmpdir, stdout=stdout,
+                            universal_newlines=True)
+            _, stderr = run.communicate()
+
+            if showmatches:
+                print(_)
 
         logger.debug("Stderr: {}".format(stderr))
         if any(word in stderr.lower() for word in ['error', 'fehler']):
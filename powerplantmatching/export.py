@@ -65,13 +65,13 @@ def to_pypsa_network(df, network, buslist=None):
     df.Set.replace('CHP', 'PP', inplace=True)
     if 'Duration' in df:
         df['weighted_duration'] = df['Duration'] * df['Capacity']
-        df = (df.groupby(['bus', 'Fueltype', 'Set'])
+        df = (df.groupby(['bus', 'Fueltype', 'Set'], observed=True)
                 .aggregate({'Capacity': sum,
                             'weighted_duration': sum}))
         df = df.assign(Duration=df['weighted_duration'] / df['Capacity'])
         df = df.drop(columns='weighted_duration')
     else:
-        df = (df.groupby(['bus', 'Fueltype', 'Set'])
+        df = (df.groupby(['bus', 'Fueltype', 'Set'], observed=True)
                 .aggregate({'Capacity': sum}))
     df = df.reset_index()
     df = to_pypsa_names(df)
@@ -108,7 +108,7 @@ def to_TIMES(df=None, use_scaled_capacity=False, baseyear=2015):
 
     # add column with TIMES-specific type. The pattern is as follows:
     # 'ConELC-' + Set + '_' + Fueltype + '-' Technology
-    df.loc[:, 'Technology'].fillna('', inplace=True)
+    df['Technology'] = df.Technology.astype(object).fillna('')
     if 'TimesType' not in df:
         pos = [i for i, x in enumerate(df.columns) if x == 'Technology'][0]
         df.insert(pos+1, 'TimesType', np.nan)
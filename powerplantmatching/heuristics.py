@@ -21,7 +21,7 @@ Functions to modify and adjust power plant datasets
 from __future__ import absolute_import, print_function
 import pandas as pd
 import numpy as np
-from .utils import lookup, _data_in, to_list_if_string
+from .utils import lookup, _data_in
 from .config import get_config
 from .cleaning import (aggregate_units, clean_technology)
 import logging
@@ -49,14 +49,14 @@ def extend_by_non_matched(df, extend_by, label=None, query=None,
         string is used if the columns of the additional database do not
         correspond to the ones of the dataset
     """
-    from .data import data_config
+    from .sources import source_registry
 
     if config is None:
         config = get_config()
 
     if isinstance(extend_by, str):
         label = extend_by
-        extend_by = data_config[label]['read_function']()
+        extend_by = source_registry[label]['read_function']()
 
     if df.columns.nlevels > 1:
         included_ids = df['projectID', label].dropna().sum()
@@ -124,7 +124,8 @@ def rescale_capacities_to_country_totals(df, fueltypes):
 
 
 def fill_missing_duration(df):
-    mean_duration = df[df.Set == 'Store'].groupby('Fueltype').Duration.mean()
+    mean_duration = (df[df.Set == 'Store'].groupby('Fueltype', observed=True)
+                     .Duration.mean())
     for store in mean_duration.index:
         df.loc[(df['Set'] == 'Store') & (df['Fueltype'] == store),
                'Duration'] = mean_duration.at[store]
@@ -155,12 +156,12 @@ def extend_by_VRE(df, base_year, prune_beyond=True):
     cols = df.columns
     # Take CH, DE, DK values from OPSD
     logger.info('Read OPSD_VRE dataframe...')
-    vre_CH_DE_DK = OPSD_VRE().loc[lambda x: x.Fueltype.isin(['Solar', 'Wind',
-                                                             'Bioenergy'])]
-    vre_DK = vre_CH_DE_DK[vre_CH_DE_DK.Country == 'Denmark']
-    vre_CH_DE = vre_CH_DE_DK[vre_CH_DE_DK.Country != 'Denmark']
+    vre_fueltypes = ['Solar', 'Wind', 'Bioenergy']
+    vre_DK = OPSD_VRE(countries=['Denmark'], fueltypes=vre_fueltypes)
     logger.info('Aggregate CH+DE by commyear')
-    vre_CH_DE = aggregate_VRE_by_commyear(vre_CH_DE)
+    vre_CH_DE = aggregate_VRE_by_commyear(
+        OPSD_VRE(countries=['Switzerland', 'Germany'],
+                 fueltypes=vre_fueltypes, chunksize=100000))
     vre_CH_DE.loc[:, 'File'] = 'renewable_power_plants.sqlite'
     # Take other countries from IRENA stats without:
     # DE, DK_Wind+Solar+Hydro, CH_Bioenergy
@@ -213,6 +214,28 @@ def average_empty_commyears(df):
     return df
 
 
+def _sum_VRE_cohorts(df, target_fueltypes):
+    """
+    Sum up the units of df per cohort, which is the partial aggregation of
+    aggregate_VRE_by_commyear. Unknown commissioning years are set to -1.
+    """
+    keys = ['Country', 'Fueltype', 'Technology', 'YearCommissioned']
+    df = df[df.Fueltype.isin(target_fueltypes)]
+    sums = pd.DataFrame({'Capacity': df.Capacity.fillna(0.),
+                         'Units': 1.})
+    for c in ['lat', 'lon']:
+        known = df[c].notnull() & df.Capacity.notnull()
+        sums[c] = df[c].fillna(0.)
+        sums[c + '_n'] = df[c].notnull().astype(float)
+        sums[c + '_w'] = (df[c] * df.Capacity).where(known, 0.)
+        sums[c + '_cap'] = df.Capacity.where(known, 0.)
+    sums = sums.assign(Country=df.Country.astype(object),
+                       Fueltype=df.Fueltype.astype(object),
+                       Technology=df.Technology.astype(object).fillna('-'),
+                       YearCommissioned=df.YearCommissioned.fillna(-1))
+    return sums.groupby(keys, sort=False).sum().reset_index()
+
+
 def aggregate_VRE_by_commyear(df, target_fueltypes=None, agg_geo_by=None):
     """
     Aggregate the vast number of VRE (e.g. vom data.OPSD_VRE()) units to one
@@ -220,8 +243,10 @@ def aggregate_VRE_by_commyear(df, target_fueltypes=None, agg_geo_by=None):
 
     Parameters
     ----------
-    df : pd.DataFrame
-        DataFrame containing the data to aggregate
+    df : pd.DataFrame | iterator of pd.DataFrame
+        DataFrame containing the data to aggregate, or chunks of it as
+        returned by data.OPSD_VRE(chunksize=...), which are aggregated one
+        after another
     target_fueltypes : list
         list of fueltypes to be aggregated (Others are cutted!)
     agg_by_geo : str
@@ -230,29 +255,53 @@ def aggregate_VRE_by_commyear(df, target_fueltypes=None, agg_geo_by=None):
             'mean'   : Average geoposition
             'wm'     : Average geoposition weighted by capacity
     """
-    df = df.copy()
-    if agg_geo_by is None:
-        f = {'Capacity': ['sum']}
-    elif agg_geo_by == 'mean':
-        f = {'Capacity': ['sum'], 'lat': ['mean'], 'lon': ['mean']}
-    elif agg_geo_by == 'wm':
-        # TODO: This does not work yet, when NaNs are in lat/lon columns.
-        wm = lambda x: np.average(x, weights=df.loc[x.index, 'Capacity'])
-        f = {'Capacity': ['sum'],
-             'lat': {'weighted mean': wm},
-             'lon': {'weighted mean': wm}}
-    else:
-        raise TypeError("Value given for `agg_geo_by` is '{}' but must be either \
-                        'NoneType' or 'mean' or 'wm'.".format(agg_geo_by))
-
+    if agg_geo_by not in [None, 'mean', 'wm']:
+        raise TypeError("Value given for `agg_geo_by` is '{}' but must be "
+                        "either 'NoneType' or 'mean' or 'wm'."
+                        .format(agg_geo_by))
     if target_fueltypes is None:
         target_fueltypes = ['Wind', 'Solar', 'Bioenergy']
-    df = df[df.Fueltype.isin(target_fueltypes)]
-    df = average_empty_commyears(df)
-    df.Technology.fillna('-', inplace=True)
-    df = (df.groupby(['Country', 'YearCommissioned', 'Fueltype', 'Technology'])
-            .agg(f).reset_index().replace({'-': np.NaN}))
-    df.columns = df.columns.droplevel(level=1)
+    if isinstance(df, pd.DataFrame):
+        df = [df]
+
+    keys = ['Country', 'Fueltype', 'Technology', 'YearCommissioned']
+    sums = [_sum_VRE_cohorts(chunk, target_fueltypes) for chunk in df]
+    if not sums:
+        empty = pd.DataFrame(columns=keys + ['Capacity', 'lat', 'lon'])
+        sums = [_sum_VRE_cohorts(empty, target_fueltypes)]
+    df = pd.concat(sums, ignore_index=True)
+
+    # Fill the empty commissioning years with averages, 1st try country-
+    # and fueltypespecific, 2nd only fueltype-specific, 3rd only
+    # country-specific averages, see average_empty_commyears
+    known = df.YearCommissioned >= 0
+    df = df.assign(YearSum=df.YearCommissioned * df.Units)
+    fill = pd.Series(np.nan, index=df.index)
+    for by in [['Country', 'Fueltype'], ['Fueltype'], ['Country']]:
+        avg = df[known].groupby(by)[['YearSum', 'Units']].sum()
+        avg = (avg.YearSum / avg.Units).rename('average')
+        fill = fill.fillna(df.join(avg, on=by)['average'])
+    if fill[~known].isnull().any():
+        count = int(df.Units[~known & fill.isnull()].sum())
+        raise ValueError('''There are still *{0}* empty values for
+                            'YearCommissioned' in the DataFrame. These should
+                            be either be filled manually or dropped to
+                            continue.'''.format(count))
+    df.loc[~known, 'YearCommissioned'] = fill[~known]
+    df = df.assign(YearCommissioned=df.YearCommissioned.astype(int))
+
+    df = (df.groupby(['Country', 'YearCommissioned', 'Fueltype',
+                      'Technology']).sum().reset_index())
+    columns = ['Country', 'YearCommissioned', 'Fueltype', 'Technology',
+               'Capacity']
+    if agg_geo_by is not None:
+        columns += ['lat', 'lon']
+        for c in ['lat', 'lon']:
+            if agg_geo_by == 'mean':
+                df[c] = df[c] / df[c + '_n'].where(df[c + '_n'] > 0)
+            else:
+                df[c] = df[c + '_w'] / df[c + '_cap'].where(df[c + '_cap'] > 0)
+    df = df[columns].replace({'Technology': {'-': np.nan}})
     return df.assign(Set='PP',
                      Retrofit=df.YearCommissioned)
 
@@ -321,8 +370,8 @@ def derive_vintage_cohorts_from_statistics(df, base_year=2015, config=None):
         config = get_config()
 
     dfe = pd.DataFrame(columns=df.columns)
-    for c, df_country in df.groupby(['Country']):
-        for tech, dfs in df_country.groupby(['Technology']):
+    for c, df_country in df.groupby(['Country'], observed=True):
+        for tech, dfs in df_country.groupby(['Technology'], observed=True):
             dfs.set_index('Year', drop=False, inplace=True)
             y_start = dfs.index[0]
             y_end = dfs.index[-1]
@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016-2018 Fabian Hofmann (FIAS), Jonas Hoersch (KIT, IAI) and
+# Fabian Gotzens (FZJ, IEK-STE)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Native record linkage engine, reproducing the comparators and the scoring of
+Duke without running the java application.
+"""
+
+from __future__ import absolute_import, print_function, division
+
+import os
+import sys
+import unicodedata
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+import logging
+
+from .utils import _data
+
+logger = logging.getLogger(__name__)
+text = str if sys.version_info >= (3, 0) else unicode
+
+# number of record pairs which are scored at once
+chunksize = 2000000
+earth_radius = 6371000.
+
+
+def read_duke_config(fn):
+    """
+    Parse a Duke configuration file and return a dict with the threshold and
+    the list of compared properties. Each property holds its comparator,
+    the comparator parameters, the low and high probabilities as well as the
+    column and the cleaner it is read from.
+
+    Parameters
+    ----------
+    fn : str
+        Name of the configuration file in powerplantmatching/data, e.g.
+        'Comparison.xml', or full path to it
+    """
+    if not os.path.exists(fn):
+        fn = _data(fn)
+    root = ET.parse(fn).getroot()
+
+    objects = {}
+    for obj in root.iter('object'):
+        params = {p.get('name'): p.get('value') for p in obj.iter('param')}
+        objects[obj.get('name')] = (obj.get('class').split('.')[-1], params)
+
+    columns = {}
+    for col in root.iter('column'):
+        cleaner = col.get('cleaner')
+        columns.setdefault(col.get('property'),
+                           (col.get('name'),
+                            None if cleaner is None
+                            else cleaner.split('.')[-1]))
+
+    schema = root.find('schema')
+    properties = []
+    for prop in schema.iter('property'):
+        if prop.get('type') == 'id':
+            continue
+        name = prop.findtext('name').strip()
+        comparator = prop.findtext('comparator').strip()
+        comparator, params = objects.get(
+                comparator, (comparator.split('.')[-1], {}))
+        column, cleaner = columns[name]
+        properties.append(dict(name=name, comparator=comparator,
+                               params=params, column=column, cleaner=cleaner,
+                               low=float(prop.findtext('low')),
+                               high=float(prop.findtext('high'))))
+    return dict(threshold=float(schema.findtext('threshold')),
+                properties=properties)
+
+
+# =============================================================================
+# Cleaners
+# =============================================================================
+
+def lowercase_normalize(s):
+    """
+    Equivalent of Duke's LowerCaseNormalizeCleaner: strip accents, lower the
+    case and collapse whitespace.
+    """
+    s = unicodedata.normalize('NFKD', text(s))
+    s = u''.join(c for c in s if not unicodedata.combining(c))
+    return u' '.join(s.lower().split())
+
+
+def _strip(s):
+    return text(s).strip()
+
+
+cleaners = {'LowerCaseNormalizeCleaner': lowercase_normalize,
+            None: _strip}
+
+
+# =============================================================================
+# Comparators
+# =============================================================================
+
+def jaro_winkler(s1, s2):
+    """
+    Jaro-Winkler similarity of two strings, following the implementation in
+    Duke.
+    """
+    if s1 == s2:
+        return 1.
+    if len(s1) > len(s2):
+        s1, s2 = s2, s1
+    maxdist = len(s2) // 2
+    c = 0
+    t = 0
+    prevpos = -1
+    for ix, ch in enumerate(s1):
+        for ix2 in range(max(0, ix - maxdist), min(len(s2), ix + maxdist)):
+            if ch == s2[ix2]:
+                c += 1
+                if prevpos != -1 and ix2 < prevpos:
+                    t += 1
+                prevpos = ix2
+                break
+    if c == 0:
+        return 0.
+    score = (c / len(s1) + c / len(s2) + (c - t) / c) / 3.
+    p = 0
+    while p < min(4, len(s1)) and s1[p] == s2[p]:
+        p += 1
+    return score + p * (1 - score) / 10.
+
+
+def jaro_winkler_tokenized(s1, s2):
+    """
+    Compare all whitespace-separated tokens of two strings with
+    jaro_winkler() and average the best similarity of each token of the
+    longer string over its number of tokens, as in Duke's compareTokens.
+    """
+    if s1 == s2:
+        return 1.
+    t1, t2 = s1.split(), s2.split()
+    if len(t1) < len(t2):
+        t1, t2 = t2, t1
+    if len(t2) == 0:
+        return 0.
+    return (sum(max(jaro_winkler(a, b) for b in t2) for a in t1)
+            / len(t1))
+
+
+def qgram(s1, s2, q=2):
+    """
+    Overlap of the sets of q-grams of two strings, as in Duke's
+    QGramComparator.
+    """
+    if s1 == s2:
+        return 1.
+    q1 = set(s1[i:i+q] for i in range(len(s1) - q + 1))
+    q2 = set(s2[i:i+q] for i in range(len(s2) - q + 1))
+    if not q1 or not q2:
+        return 0.
+    return len(q1 & q2) / min(len(q1), len(q2))
+
+
+def numeric(a, b):
+    """
+    Vectorised ratio of the smaller over the larger value, as in Duke's
+    NumericComparator.
+    """
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(lo == hi, 1., lo / hi)
+
+
+def geo_neighbours(coords_a, coords_b, max_distance):
+    """
+    Return the positional indices and the great-circle distances in meters
+    of all pairs of coordinates which lie within max_distance of each other.
+    Pairs are searched with a KD-tree on the unit sphere.
+
+    Parameters
+    ----------
+    coords_a, coords_b : np.array
+        Arrays of shape (n, 2) with latitudes and longitudes, NaN values are
+        ignored
+    max_distance : float
+        Maximal distance in meters
+    """
+    from scipy.spatial import cKDTree as KDTree
+
+    def unit_vectors(coords):
+        lat, lon = np.radians(coords).T
+        return np.c_[np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                     np.sin(lat)]
+
+    valid_a = np.flatnonzero(~np.isnan(coords_a).any(axis=1))
+    valid_b = np.flatnonzero(~np.isnan(coords_b).any(axis=1))
+    if len(valid_a) == 0 or len(valid_b) == 0:
+        return np.array([], int), np.array([], int), np.array([])
+    # chord length corresponding to the great-circle distance
+    radius = 2 * np.sin(max_distance / (2 * earth_radius))
+    pairs = (KDTree(unit_vectors(coords_a[valid_a]))
+             .sparse_distance_matrix(KDTree(unit_vectors(coords_b[valid_b])),
+                                     radius, output_type='ndarray'))
+    distance = 2 * earth_radius * np.arcsin(np.clip(pairs['v'] / 2, 0., 1.))
+    return valid_a[pairs['i']], valid_b[pairs['j']], distance
+
+
+def geoposition(distance, max_distance):
+    """
+    Vectorised similarity of two geopositions given their distance, linearly
+    decreasing from 1 at zero distance to 0.5 at max-distance and 0 beyond,
+    as in Duke's GeopositionComparator.
+    """
+    return np.where(distance > max_distance, 0.,
+                    0.5 + 0.5 * (1. - distance / max_distance))
+
+
+string_comparators = {'JaroWinklerTokenized': jaro_winkler_tokenized,
+                      'JaroWinkler': jaro_winkler,
+                      'QGramComparator': qgram}
+
+
+def property_probability(sim, low, high):
+    """
+    Translate a similarity into the match probability of a single property.
+    """
+    return np.where(sim >= 0.5, (high - 0.5) * sim ** 2 + 0.5, low)
+
+
+def bayes(p1, p2):
+    """
+    Combine two independent probabilities with Bayes' theorem.
+    """
+    return p1 * p2 / (p1 * p2 + (1. - p1) * (1. - p2))
+
+
+# =============================================================================
+# Linkage
+# =============================================================================
+
+class _Property(object):
+    """
+    A single compared property, holding the prepared values of both
+    datasets.
+    """
+
+    def __init__(self, prop, dfs):
+        self.__dict__.update(prop)
+        self.is_string = self.comparator in string_comparators
+        if self.comparator == 'GeopositionComparator':
+            self.max_distance = float(self.params.get('max-distance'))
+            self.values = [df[['lat', 'lon']].astype(float).values
+                           for df in dfs]
+            self.missing = [np.isnan(v).any(axis=1) for v in self.values]
+            # distances of all neighbours within max-distance, looked up by
+            # the flat pair index ia * len(b) + ib
+            self.n_b = len(dfs[-1])
+            ia, ib, dist = geo_neighbours(self.values[0], self.values[-1],
+                                          self.max_distance)
+            self.neighbours = ia * self.n_b + ib
+            order = np.argsort(self.neighbours)
+            self.neighbours = self.neighbours[order]
+            self.distances = dist[order]
+        elif self.comparator == 'NumericComparator':
+            self.values = [pd.to_numeric(df[self.column], errors='coerce')
+                           .values.astype(float) for df in dfs]
+            self.missing = [np.isnan(v) for v in self.values]
+        elif self.is_string:
+            self.compare = string_comparators[self.comparator]
+            clean = cleaners[self.cleaner]
+            cleaned = [df[self.column].dropna().map(clean)
+                       .reindex(df.index).replace(u'', np.nan)
+                       for df in dfs]
+            codes, self.uniques = pd.factorize(pd.concat(cleaned))
+            self.values = np.split(codes, [len(dfs[0])])[:len(dfs)]
+            self.missing = [v == -1 for v in self.values]
+            self.cache = {}
+        else:
+            raise NotImplementedError("Comparator '{}' is not supported by "
+                                      "the python backend"
+                                      .format(self.comparator))
+        self.bound = max(self.high, 0.5)
+
+    def similarity(self, ia, ib):
+        if self.comparator == 'GeopositionComparator':
+            return geoposition(self.distance(ia, ib), self.max_distance)
+        a, b = self.values[0][ia], self.values[-1][ib]
+        if self.comparator == 'NumericComparator':
+            return numeric(a, b)
+        # evaluate each distinct pair of values only once
+        n = len(self.uniques)
+        pairs, inverse = np.unique(a.astype(np.int64) * n + b,
+                                   return_inverse=True)
+        sims = np.empty(len(pairs))
+        for k, pair in enumerate(pairs):
+            sim = self.cache.get(pair)
+            if sim is None:
+                sim = self.cache[pair] = self.compare(self.uniques[pair // n],
+                                                      self.uniques[pair % n])
+            sims[k] = sim
+        return sims[inverse.ravel()]
+
+    def distance(self, ia, ib):
+        """
+        Distances of the given pairs, infinite for pairs which are no
+        neighbours.
+        """
+        dist = np.full(len(ia), np.inf)
+        if len(self.neighbours):
+            pairs = ia * self.n_b + ib
+            pos = np.searchsorted(self.neighbours, pairs)
+            pos = pos.clip(max=len(self.neighbours) - 1)
+            found = self.neighbours[pos] == pairs
+            dist[found] = self.distances[pos[found]]
+        return dist
+
+    def probability(self, ia, ib):
+        missing = self.missing[0][ia] | self.missing[-1][ib]
+        prob = np.full(len(ia), 0.5)
+        if (~missing).any():
+            ia, ib = ia[~missing], ib[~missing]
+            prob[~missing] = property_probability(
+                    self.similarity(ia, ib), self.low, self.high)
+        return prob
+
+
+def candidate_pairs(n_a, n_b, dedup=False):
+    """
+    Generate all record pairs of two datasets of length n_a and n_b in chunks
+    of positional indices. In deduplication mode each unordered pair is
+    generated only once.
+    """
+    step = max(1, chunksize // max(n_b, 1))
+    for start in range(0, n_a, step):
+        ia, ib = np.meshgrid(np.arange(start, min(start + step, n_a)),
+                             np.arange(n_b), indexing='ij')
+        ia, ib = ia.ravel(), ib.ravel()
+        if dedup:
+            ia, ib = ia[ia < ib], ib[ia < ib]
+        yield ia, ib
+
+
+def blocked_pairs(dfs, dedup=False, max_distance=None, how='country'):
+    """
+    Generate candidate record pairs in chunks of positional indices.
+
+    With how='country', pairs sharing the Country and a compatible Fueltype
+    (the same one or a missing one on either side) are generated, as well as
+    all pairs lying within max_distance meters of each other. With
+    how='geo', records with coordinates are only paired with their
+    neighbours within max_distance, while pairs lacking coordinates on either
+    side fall back to the Country and Fueltype blocking.
+
+    Parameters
+    ----------
+    dfs : list of pd.DataFrame
+        One (deduplication) or two datasets (record linkage)
+    dedup : Boolean, default False
+        Whether to generate each unordered pair within one dataset only once
+    max_distance : float, default None
+        Maximal distance in meters, geographical neighbours are not added if
+        None
+    how : str, default 'country'
+        Blocking strategy, either 'country' or 'geo'
+    """
+    if how not in ('country', 'geo'):
+        raise ValueError("Blocking has to be 'country' or 'geo', got '{}'"
+                         .format(how))
+    if how == 'geo' and max_distance is None:
+        raise ValueError("Blocking by 'geo' requires a geoposition comparator")
+
+    coords = [df[['lat', 'lon']].values.astype(float) for df in dfs]
+    keys = ['Country', 'Fueltype']
+    a, b = [pd.DataFrame({'Country': df['Country'].values,
+                          'Fueltype': df['Fueltype'].str.lower().values,
+                          'located': ~np.isnan(c).any(axis=1),
+                          'i': np.arange(len(df))})
+            .dropna(subset=['Country'])
+            for df, c in ((dfs[0], coords[0]), (dfs[-1], coords[-1]))]
+    known_a, known_b = a.Fueltype.notnull(), b.Fueltype.notnull()
+    pairs = pd.concat([
+        a[known_a].merge(b[known_b], on=keys),
+        a[~known_a].drop('Fueltype', axis=1).merge(
+                b.drop('Fueltype', axis=1), on='Country'),
+        a[known_a].drop('Fueltype', axis=1).merge(
+                b[~known_b].drop('Fueltype', axis=1), on='Country')])
+    if how == 'geo':
+        pairs = pairs[~(pairs.located_x & pairs.located_y)]
+    ia, ib = pairs.i_x.values.astype(int), pairs.i_y.values.astype(int)
+
+    if max_distance is not None:
+        ga, gb, _ = geo_neighbours(coords[0], coords[-1], max_distance)
+        ia, ib = np.r_[ia, ga], np.r_[ib, gb]
+
+    if dedup:
+        ia, ib = ia[ia < ib], ib[ia < ib]
+    n_b = len(dfs[-1])
+    pairs = np.unique(ia * n_b + ib)
+    for start in range(0, len(pairs), chunksize):
+        chunk = pairs[start:start + chunksize]
+        yield chunk // n_b, chunk % n_b
+
+
+def score_pairs(properties, threshold, ia, ib):
+    """
+    Score the given record pairs and return the pairs exceeding the
+    threshold together with their probabilities. Cheap vectorised
+    comparisons are done first, string comparisons are only done for pairs
+    which can still exceed the threshold.
+    """
+    prob = np.full(len(ia), 0.5)
+    for i, prop in enumerate(properties):
+        if prop.is_string:
+            bound = prob
+            for other in properties[i:]:
+                bound = bayes(bound, other.bound)
+            keep = bound > threshold
+            ia, ib, prob = ia[keep], ib[keep], prob[keep]
+        prob = bayes(prob, prop.probability(ia, ib))
+    keep = prob > threshold
+    return ia[keep], ib[keep], prob[keep]
+
+
+def link(datasets, labels=['one', 'two'], singlematch=False,
+         blocking=False, duke_config=None):
+    """
+    Pure python alternative to powerplantmatching.duke.duke(). Applies the
+    comparators, probabilities and threshold given in the Duke configuration
+    files and returns the links in the same format.
+
+    Parameters
+    ----------
+    datasets : pd.DataFrame or [pd.DataFrame]
+        A single dataframe is run in deduplication mode, while multiple ones
+        are linked
+    labels : [str], default ['one', 'two']
+        Labels for the linked dataframe
+    singlematch: boolean, default False
+        Only in Record Linkage Mode. Only report the best match for each entry
+        of the first named dataset. This does not guarantee a unique match in
+        the second named dataset.
+    blocking : Boolean or str, default False
+        Only score candidate record pairs, see blocked_pairs(). If True or
+        'country', pairs share the Country and a compatible Fueltype or lie
+        within the max-distance of the geoposition comparator. If 'geo',
+        located records are only compared with their neighbours within the
+        max-distance and the others fall back to the Country blocking. If
+        the comparators allow distant pairs to exceed the threshold, the
+        Country blocking is used instead.
+    duke_config : str, default None
+        Duke configuration file to take the comparators from, defaults to
+        'Deleteduplicates.xml' in deduplication and 'Comparison.xml' in
+        record linkage mode
+    """
+    dedup = isinstance(datasets, pd.DataFrame)
+    if dedup:
+        datasets = [datasets]
+    if duke_config is None:
+        duke_config = 'Deleteduplicates.xml' if dedup else 'Comparison.xml'
+    conf = read_duke_config(duke_config)
+
+    logger.debug("Comparing files: %s", ", ".join(labels))
+
+    properties = [_Property(p, datasets) for p in conf['properties']]
+    # vectorised comparisons first, then strings by number of distinct values
+    properties.sort(key=lambda p: (p.is_string,
+                                   len(getattr(p, 'uniques', []))))
+
+    n_a, n_b = len(datasets[0]), len(datasets[-1])
+    if blocking:
+        max_distance = next((p.max_distance for p in properties
+                             if p.comparator == 'GeopositionComparator'),
+                            None)
+        how = 'country' if blocking is True else blocking
+        if how == 'geo' and max_distance is not None:
+            # located pairs beyond the max-distance may only be pruned if
+            # the low geoposition probability keeps them below the threshold
+            bound = 0.5
+            for p in properties:
+                bound = bayes(bound,
+                              p.low if p.comparator == 'GeopositionComparator'
+                              else p.bound)
+            if bound > conf['threshold']:
+                logger.warning("Distant record pairs can exceed the threshold "
+                               "of '{}', blocking by 'country' instead of "
+                               "'geo'".format(duke_config))
+                how = 'country'
+        pairs = list(blocked_pairs(datasets, dedup=dedup,
+                                   max_distance=max_distance, how=how))
+        n_total = n_a * (n_a - 1) // 2 if dedup else n_a * n_b
+        n_blocked = sum(len(ia) for ia, ib in pairs)
+        logger.info("Blocking reduced the number of compared record pairs "
+                    "from {} to {} ({:.1%} pruned)"
+                    .format(n_total, n_blocked,
+                            1. - n_blocked / max(n_total, 1)))
+    else:
+        pairs = candidate_pairs(n_a, n_b, dedup=dedup)
+    links = [score_pairs(properties, conf['threshold'], ia, ib)
+             for ia, ib in pairs]
+    if links:
+        ia, ib, scores = map(np.concatenate, zip(*links))
+    else:
+        ia, ib, scores = np.array([], int), np.array([], int), np.array([])
+
+    index_a, index_b = datasets[0].index, datasets[-1].index
+    if dedup:
+        # Duke reports each duplicate in both directions
+        return (pd.DataFrame({labels[0]: index_a[np.r_[ia, ib]],
+                              labels[1]: index_b[np.r_[ib, ia]]})
+                .sort_values(labels).reset_index(drop=True))
+
+    links = pd.DataFrame({labels[0]: index_a[ia], labels[1]: index_b[ib],
+                          'scores': scores}, columns=labels + ['scores'])
+    if singlematch:
+        links = (links.sort_values('scores', ascending=False, kind='mergesort')
+                 .drop_duplicates(labels[0]))
+    return links.sort_values(labels).reset_index(drop=True)
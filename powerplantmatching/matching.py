@@ -21,19 +21,28 @@ Functions for linking and combining different datasets
 from __future__ import absolute_import, print_function
 
 from .config import get_config
-from .utils import read_csv_if_string, _data_out, parmap
+from .utils import (read_csv_if_string, _data, _data_out, parmap,
+                    set_categories)
 from .duke import duke
 from .cleaning import clean_technology
-from .data import data_config
+from .sources import source_registry
 
 import pandas as pd
 import numpy as np
 import itertools
+import hashlib
+import glob
+import os
+import re
 import logging
 logger = logging.getLogger(__name__)
 
+# columns which are taken into account for the comparison of two datasets
+compared_columns = ['Name', 'Fueltype', 'Technology', 'Country', 'Capacity',
+                    'lat', 'lon']
 
-def best_matches(links):
+
+def best_matches(links, one_to_one=False):
     """
     Subsequent to duke() with singlematch=True. Returns reduced list of
     matches on the base of the highest score for each duplicated entry.
@@ -42,14 +51,178 @@ def best_matches(links):
     ----------
     links : pd.DataFrame
         Links as returned by duke
+    one_to_one : Boolean, default False
+        Whether to make the entries of both datasets unique by choosing the
+        links with the highest total score, see assign_matches(). By default
+        only the entries of the second dataset are made unique.
+    """
+    labels = links.columns.drop('scores')
+    if one_to_one:
+        return assign_matches(links)[labels].reset_index(drop=True)
+    return (links.sort_values('scores', ascending=False, kind='mergesort')
+            .drop_duplicates(labels[1])
+            .sort_index()[labels]
+            .reset_index(drop=True))
+
+
+def assign_matches(links):
+    """
+    Reduce links to a one-to-one matching with the maximal sum of scores,
+    i.e. a maximum weight matching of the sparse bipartite link graph. The
+    assignment problem is solved separately for each connected component of
+    the graph, links without competitors are kept directly.
+
+    Parameters
+    ----------
+    links : pd.DataFrame
+        Links as returned by duke
+    """
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    labels = links.columns.drop('scores')
+    links = (links.sort_values('scores', ascending=False, kind='mergesort')
+             .drop_duplicates(labels.tolist()).sort_index())
+    if not len(links):
+        return links
+    ia, a = pd.factorize(links[labels[0]])
+    ib, b = pd.factorize(links[labels[1]])
+    scores = links.scores.values
+    n = len(a) + len(b)
+    graph = coo_matrix((np.ones(len(links)), (ia, ib + len(a))),
+                       shape=(n, n))
+    component = connected_components(graph, directed=False)[1][ia]
+
+    single = np.bincount(component)[component] == 1
+    keep = [np.flatnonzero(single)]
+    order = np.flatnonzero(~single)
+    order = order[np.argsort(component[order], kind='mergesort')]
+    bounds = np.flatnonzero(np.diff(component[order])) + 1
+    for block in np.split(order, bounds) if len(order) else []:
+        ra, ca = np.unique(ia[block], return_inverse=True)
+        rb, cb = np.unique(ib[block], return_inverse=True)
+        # pairs without link cost as much as leaving both entries unmatched
+        costs = np.zeros((len(ra), len(rb)))
+        costs[ca, cb] = - scores[block]
+        position = np.full(costs.shape, -1, dtype=int)
+        position[ca, cb] = block
+        chosen = position[linear_sum_assignment(costs)]
+        keep.append(chosen[chosen != -1])
+    return links.iloc[np.sort(np.concatenate(keep))]
+
+
+def matches_key(datasets, labels, blocking=False, one_to_one=False,
+                config=None, **dukeargs):
+    """
+    Return a hash of the compared columns of two datasets, the comparator
+    configuration in Comparison.xml, the matching backend, the matching mode
+    and the arguments passed to duke. Saved matches of two datasets are only
+    reused as long as this key does not change.
+
+    Parameters
+    ----------
+    datasets : list of pandas.Dataframe
+        dataframes to use for the matching
+    labels : list of strings
+        Names of the databases
+    """
+    if config is None:
+        config = get_config()
+
+    sha1 = hashlib.sha1()
+    for label, df in sorted(zip(labels, datasets), key=lambda x: x[0]):
+        sha1.update(label.encode('utf-8'))
+        cols = [c for c in compared_columns if c in df]
+        sha1.update(pd.util.hash_pandas_object(df[cols]).values.tobytes())
+    with open(_data('Comparison.xml'), 'rb') as f:
+        sha1.update(f.read())
+    sha1.update(repr((config.get('matching_backend', 'duke'), blocking,
+                      sorted(dukeargs.items()))).encode('utf-8'))
+    if one_to_one:
+        sha1.update(b'one_to_one')
+    return sha1.hexdigest()[:12]
+
+
+def dataset_rows(df, label):
     """
-    labels = links.columns.difference({'scores'})
-    return (links
-            .groupby(links.iloc[:, 1], as_index=False, sort=False)
-            .apply(lambda x: x.loc[x.scores.idxmax(), labels]))
+    Return a fingerprint of each entry of a dataset, consisting of its index,
+    a key derived from its projectID and a hash of the compared columns.
+    These are saved along with the matches to allow for incremental updates.
+
+    Parameters
+    ----------
+    df : pandas.Dataframe
+        dataset used for the matching
+    label : str
+        Name of the dataset
+    """
+    cols = [c for c in compared_columns if c in df]
+    if 'projectID' in df:
+        keys = df.projectID.map(lambda x: str(sorted(x))
+                                if isinstance(x, list) else str(x))
+    else:
+        keys = df.index.astype(str).to_series(index=df.index)
+    return pd.DataFrame({'label': label, 'id': df.index, 'key': keys.values,
+                         'hash': (pd.util.hash_pandas_object(df[cols],
+                                                             index=False)
+                                  .map('{:016x}'.format).values)},
+                        columns=['label', 'id', 'key', 'hash'])
 
 
-def compare_two_datasets(datasets, labels, use_saved_matches=False,
+def incremental_matches(datasets, labels, previous, blocking=False,
+                        config=None, **dukeargs):
+    """
+    Update the saved matches of a previous state of two datasets. Links
+    between entries that are unchanged (same projectID and same compared
+    values) are kept. Added or modified entries are matched against the full
+    other dataset, and links of removed entries are dropped. Conflicting
+    links are resolved by their scores as in best_matches(). The result
+    approximates a full matching, since links discarded by best_matches() in
+    the previous run are not reconsidered for unchanged entries.
+
+    Parameters
+    ----------
+    datasets : list of pandas.Dataframe
+        current state of the datasets
+    labels : list of strings
+        Names of the databases
+    previous : str
+        Path of the previously saved matches, the fingerprints of the
+        previous datasets are expected next to it ('_rows' appended)
+    """
+    old_links = pd.read_csv(previous, index_col=0)
+    old_rows = pd.read_csv(previous[:-len('.csv')] + '_rows.csv',
+                           dtype={'key': str, 'hash': str})
+
+    unchanged, kept = [], old_links.reindex(columns=labels + ['scores'])
+    for label, df in zip(labels, datasets):
+        rows = dataset_rows(df, label).drop_duplicates('key', keep=False)
+        old = (old_rows[old_rows.label == label]
+               .drop_duplicates('key', keep=False))
+        same = old.merge(rows, on=['key', 'hash'], suffixes=('_old', ''))
+        id_map = pd.Series(same.id.values, index=same.id_old.values)
+        kept = kept[kept[label].isin(id_map.index)]
+        kept = kept.assign(**{label: kept[label].map(id_map).values})
+        unchanged.append(df.index.isin(same.id.values))
+        logger.info("{} of {} entries of '{}' unchanged since the last "
+                    "matching".format(unchanged[-1].sum(), len(df), label))
+
+    (a, b), (ua, ub) = datasets, unchanged
+    links = [kept]
+    for pair in [(a[~ua], b), (a[ua], b[~ub])]:
+        if len(pair[0]) and len(pair[1]):
+            links.append(duke(list(pair), labels=labels, blocking=blocking,
+                              config=config, **dukeargs))
+    links = pd.concat(links, ignore_index=True)
+    if dukeargs.get('singlematch', True):
+        links = (links.sort_values('scores', ascending=False)
+                 .drop_duplicates(labels[0]))
+    return links
+
+
+def compare_two_datasets(datasets, labels, use_saved_matches=True,
+                         blocking=False, incremental=False, one_to_one=None,
                          config=None, **dukeargs):
     """
     Duke-based horizontal match of two databases. Returns the matched
@@ -70,29 +243,87 @@ def compare_two_datasets(datasets, labels, use_saved_matches=False,
         dataframes or csv-files to use for the matching
     labels : list of strings
         Names of the databases for the resulting dataframe
-
-
+    use_saved_matches : Boolean, default True
+        Whether to reuse the matches saved by a previous run, which is done
+        by default. The saved matches are keyed by matches_key(), such that
+        they are only reused if neither the compared columns of the datasets
+        nor the comparator configuration changed. Set to False to match
+        again in any case. Files matches_<label>_<label>.csv saved without
+        a key by earlier versions are never reused, as the state of the
+        datasets they were matched from is unknown, and are replaced by the
+        new matches.
+    blocking : Boolean or str, default False
+        Only compare pairs of entries sharing the Country and a compatible
+        Fueltype or lying within the maximal distance of the geoposition
+        comparator (True or 'country'). With 'geo', located entries are only
+        compared with entries nearby, entries without coordinates with the
+        ones of the same Country. The number of pruned pairs is logged.
+        Requires 'matching_backend: python' in the config.
+    incremental : Boolean, default False
+        If the saved matches are outdated, only match the entries which were
+        added or modified since the previous matching of the two datasets,
+        see incremental_matches().
+    one_to_one : Boolean, default None
+        Whether to make the entries of both datasets unique by a maximum
+        weight matching, see best_matches(). Defaults to the config entry
+        'one_to_one_matching'.
     """
     if config is None:
         config = get_config()
+    if one_to_one is None:
+        one_to_one = config.get('one_to_one_matching', False)
 
     datasets = list(map(read_csv_if_string, datasets))
     if not ('singlematch' in dukeargs):
         dukeargs['singlematch'] = True
-    saving_path = _data_out('matches/matches_{}_{}.csv'
-                            .format(*np.sort(labels)), config=config)
+    key = matches_key(datasets, labels, blocking=blocking,
+                      one_to_one=one_to_one, config=config, **dukeargs)
+    prefix = _data_out('matches/matches_{}_{}_'.format(*np.sort(labels)),
+                       config=config)
+    saving_path = prefix + key + '.csv'
     if use_saved_matches:
-        try:
+        if os.path.exists(saving_path):
             logger.info('Reading saved matches for datasets {} and {}'
                         .format(*labels))
-            return pd.read_csv(saving_path, index_col=0)
-        except (ValueError, IOError):
-            logger.warning("Non-existing saved matches for dataset '{}', '{}'"
-                           " continuing by matching again".format(*labels))
-    links = duke(datasets, labels=labels, **dukeargs)
-    matches = best_matches(links)
+            return pd.read_csv(saving_path, index_col=0).reindex(
+                    columns=labels)
+        logger.info("No saved matches for the current state of datasets "
+                    "'{}', '{}', continuing by matching again"
+                    .format(*labels))
+
+    # saved matches of the same pair of datasets for other states
+    outdated = [fn for fn in glob.glob(prefix + '*.csv')
+                if re.match('[0-9a-f]{12}(_rows)?\\.csv$', fn[len(prefix):])]
+    legacy = prefix[:-1] + '.csv'
+    if os.path.exists(legacy):
+        logger.warning("Ignoring the matches in {} saved by an earlier "
+                       "version, they are replaced by the new matches"
+                       .format(legacy))
+        outdated.append(legacy)
+    previous = [fn for fn in outdated
+                if not fn.endswith('_rows.csv') and
+                os.path.exists(fn[:-len('.csv')] + '_rows.csv')]
+
+    if incremental and previous:
+        logger.info('Updating saved matches for datasets {} and {}'
+                    .format(*labels))
+        links = incremental_matches(datasets, labels,
+                                    max(previous, key=os.path.getmtime),
+                                    blocking=blocking, config=config,
+                                    **dukeargs)
+    else:
+        links = duke(datasets, labels=labels, blocking=blocking,
+                     config=config, **dukeargs)
+    matches = best_matches(links, one_to_one=one_to_one)
+    matches = matches.merge(links, on=labels, how='left').reindex(
+            columns=labels + ['scores'])
+
+    for fn in outdated:
+        os.remove(fn)
     matches.to_csv(saving_path)
-    return matches
+    pd.concat([dataset_rows(df, label) for label, df in zip(labels, datasets)]
+              ).to_csv(prefix + key + '_rows.csv', index=False)
+    return matches.reindex(columns=labels)
 
 
 def cross_matches(sets_of_pairs, labels=None):
@@ -102,6 +333,11 @@ def cross_matches(sets_of_pairs, labels=None):
     though they did not match directly but indirectly through a
     connecting identifier of another database.
 
+    Every identifier is regarded as a node and every match as an edge of a
+    graph. The identifiers of a connected component form one row, as long
+    as the component contains at most one identifier per database.
+    Conflicting components are resolved by conflicting_matches().
+
     Parameters
     ----------
     sets_of_pairs : list
@@ -113,32 +349,91 @@ def cross_matches(sets_of_pairs, labels=None):
         of the output
 
     """
-    m_all = sets_of_pairs
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    m_all = [m.dropna() for m in sets_of_pairs]
     if labels is None:
         labels = np.unique([x.columns for x in m_all])
+
+    # number the identifiers of each database consecutively
+    ids = {}
+    for m in m_all:
+        for label in m:
+            ids.setdefault(label, []).append(m[label].values)
+    nodes, positions, offset = [], {}, 0
+    for label, values in ids.items():
+        codes, uniques = pd.factorize(np.concatenate(values))
+        nodes.append(pd.DataFrame({'source': label, 'id': uniques}))
+        splits = np.cumsum(list(map(len, values)))[:-1]
+        positions[label] = iter(np.split(codes + offset, splits))
+        offset += len(uniques)
+    nodes = pd.concat(nodes, ignore_index=True)
+    # positions of the matched identifiers in nodes, in the order of m_all
+    ends = [[next(positions[label]) for label in m] for m in m_all]
+
+    a, b = (np.concatenate([e[i] for e in ends] + [[]]).astype(int)
+            for i in range(2))
+    graph = coo_matrix((np.ones(len(a)), (a, b)),
+                       shape=(len(nodes), len(nodes)))
+    nodes['component'] = connected_components(graph, directed=False)[1]
+
+    conflicting = nodes.duplicated(['component', 'source'], keep=False)
+    conflicting = nodes.component.isin(nodes.component[conflicting]).values
+    matches = (nodes[~conflicting]
+               .pivot(index='component', columns='source', values='id')
+               .rename_axis(None, axis=1).reset_index(drop=True))
+    if conflicting.any():
+        pairs = [m[conflicting[e[0]]] for m, e in zip(m_all, ends)]
+        matches = pd.concat([matches, conflicting_matches(pairs, labels)],
+                            ignore_index=True, sort=False)
+
+    return (matches
+            .assign(length=matches.notna().sum(axis=1))
+            .sort_values(by='length', ascending=False, kind='mergesort')
+            .reset_index(drop=True)
+            .drop('length', axis=1)
+            .reindex(columns=labels))
+
+
+def conflicting_matches(sets_of_pairs, labels):
+    """
+    Combine matches which connect more than one identifier of the same
+    database, i.e. which can not be joined to one consistent row. For
+    each identifier a row with all of its direct matches is built. Per
+    database, only the row with the fewest missing identifiers is kept for
+    every identifier.
+
+    Parameters
+    ----------
+    sets_of_pairs : list
+        list of pd.Dataframe's containing only the matches
+    labels : list of strings
+        list of names of the databases
+    """
+    m_all = sets_of_pairs
     matches = pd.DataFrame(columns=labels)
     for i in labels:
         base = [m.set_index(i) for m in m_all if i in m]
-        match_base = pd.concat(base, axis=1).reset_index()
+        if not base:
+            continue
+        match_base = pd.concat(base, axis=1).rename_axis(i).reset_index()
         matches = pd.concat([matches, match_base], sort=True)
 
     matches = matches.drop_duplicates().reset_index(drop=True)
     for i in labels:
-        matches = pd.concat([
-            matches.groupby(i, as_index=False, sort=False)
-                   .apply(lambda x: x.loc[x.isnull().sum(axis=1).idxmin()]),
-            matches[matches[i].isnull()]
-        ]).reset_index(drop=True)
-    return (matches
-            .assign(length=matches.notna().sum(axis=1))
-            .sort_values(by='length', ascending=False)
-            .reset_index(drop=True)
-            .drop('length', axis=1)
-            .reindex(columns=labels))
+        # first row with the fewest missing identifiers for each identifier
+        best = (matches[matches[i].notnull()]
+                .assign(nulls=matches.isnull().sum(axis=1))
+                .groupby(i, sort=False).nulls.idxmin())
+        matches = pd.concat([matches.loc[best.values],
+                             matches[matches[i].isnull()]]
+                            ).reset_index(drop=True)
+    return matches
 
 
-def link_multiple_datasets(datasets, labels, use_saved_matches=False,
-                           config=None, **dukeargs):
+def link_multiple_datasets(datasets, labels, use_saved_matches=True,
+                           progress=None, config=None, **dukeargs):
     """
     Duke-based horizontal match of multiple databases. Returns the
     matching indices of the datasets. Compares all properties of the
@@ -156,6 +451,9 @@ def link_multiple_datasets(datasets, labels, use_saved_matches=False,
     labels : list of strings
         Names of the databases in alphabetical order and corresponding
         order to the datasets
+    progress : function, default None
+        Called as progress(done, total) after each compared pair of
+        datasets, see powerplantmatching.utils.parmap()
     """
     if config is None:
         config = get_config()
@@ -163,19 +461,21 @@ def link_multiple_datasets(datasets, labels, use_saved_matches=False,
     dfs = list(map(read_csv_if_string, datasets))
     combinations = list(itertools.combinations(range(len(labels)), 2))
 
-    def comp_dfs(dfs_lbs):
-        logger.info('Comparing {0} with {1}'.format(*dfs_lbs[2:]))
-        return compare_two_datasets(dfs_lbs[:2], dfs_lbs[2:],
+    def comp_dfs(combination):
+        # only the positions are passed, the workers share dfs
+        c, d = combination
+        logger.info('Comparing {0} with {1}'.format(labels[c], labels[d]))
+        return compare_two_datasets([dfs[c], dfs[d]], [labels[c], labels[d]],
                                     use_saved_matches=use_saved_matches,
                                     config=config, **dukeargs)
 
-    mapargs = [[dfs[c], dfs[d], labels[c], labels[d]] for c, d in combinations]
-    all_matches = parmap(comp_dfs, mapargs)
+    all_matches = parmap(comp_dfs, combinations, config=config,
+                         progress=progress)
 
     return cross_matches(all_matches, labels=labels)
 
 
-def combine_multiple_datasets(datasets, labels, use_saved_matches=False,
+def combine_multiple_datasets(datasets, labels, use_saved_matches=True,
                               config=None, **dukeargs):
     """
     Duke-based horizontal match of multiple databases. Returns the
@@ -227,7 +527,8 @@ def combine_multiple_datasets(datasets, labels, use_saved_matches=False,
                                           use_saved_matches=use_saved_matches,
                                           config=config, **dukeargs)
     return (combined_dataframe(crossmatches, datasets, config)
-            .reindex(columns=config['target_columns'], level=0))
+            .reindex(columns=config['target_columns'], level=0)
+            .pipe(set_categories, config=config))
 
 
 def reduce_matched_dataframe(df, show_orig_names=False, config=None):
@@ -242,18 +543,34 @@ def reduce_matched_dataframe(df, show_orig_names=False, config=None):
         combined_dataframe() or match_multiple_datasets()
     """
 
-    def concat_strings(s):
-        if s.isnull().all():
-            return np.nan
-        else:
-            return s[s.notnull()].str.cat(sep=', ')
+    def concat_strings(df):
+        """
+        Join the non-null strings of each row, separated by a comma
+        """
+        joined = pd.Series(np.nan, index=df.index, dtype=object)
+        for _, s in df.astype(object).items():
+            joined = (joined + ', ' + s).fillna(joined).fillna(s)
+        return joined
+
+    def to_dicts(df):
+        """
+        Return a dict of the non-null values of each row, keyed by column
+        """
+        notnull = df.notnull().values
+        rows, cols = np.nonzero(notnull)
+        dicts = [{} for _ in range(len(df))]
+        for row, key, value in zip(rows, df.columns[cols],
+                                   df.values[notnull]):
+            dicts[row][key] = value
+        return pd.Series(dicts, index=df.index)
 
     if config is None:
         config = get_config()
 
     # define which databases are present and get their reliability_score
     sources = df.columns.levels[1]
-    rel_scores = (pd.DataFrame(data_config).loc['reliability_score', sources]
+    rel_scores = (pd.DataFrame(source_registry)
+                  .loc['reliability_score', sources]
                     .sort_values(ascending=False))
 
     def prioritise_reliability(df, how='mean'):
@@ -266,18 +583,28 @@ def reduce_matched_dataframe(df, show_orig_names=False, config=None):
         df = df.loc[df.notnull().any(axis=1)]
 
         if df.empty:
-            logger.warn('Empty dataframe passed to `prioritise_reliability`.')
+            logger.warning('Empty dataframe passed to '
+                           '`prioritise_reliability`.')
             return pd.Series()
 
         df = df.reindex(columns=rel_scores.index)
+        values = df.values
 
         # Aggregate data with same reliability scores for numeric columns
         # (but DO maintain order)
-        if not ((df.dtypes == object) | (df.dtypes == str)).any():
-            # all numeric
-            df = df.groupby(rel_scores, axis=1, sort=False).agg(how)
-
-        return df.apply(lambda ds: ds.dropna().iloc[0], axis=1)
+        if all(map(pd.api.types.is_numeric_dtype, df.dtypes)):
+            scores = rel_scores.values
+            new_score = np.flatnonzero(scores[1:] != scores[:-1]) + 1
+            aggregate = getattr(np.ma, how)
+            values = np.ma.column_stack([
+                aggregate(block, axis=1) for block in
+                np.split(np.ma.masked_invalid(values.astype(float)),
+                         new_score, axis=1)]).filled(np.nan)
+
+        # first non-null value in order of reliability
+        first = pd.notnull(values).argmax(axis=1)
+        return pd.Series(values[np.arange(len(values)), first],
+                         index=df.index)
 
     sdf = pd.DataFrame.from_dict({
         'Name': prioritise_reliability(df['Name']),
@@ -293,14 +620,14 @@ def reduce_matched_dataframe(df, show_orig_names=False, config=None):
         'Retrofit': df['Retrofit'].max(axis=1),
         'lat': prioritise_reliability(df['lat']),
         'lon': prioritise_reliability(df['lon']),
-        'File': df['File'].apply(concat_strings, axis=1),
-        'projectID': df['projectID'].apply(lambda x: dict(x.dropna()), axis=1)
+        'File': concat_strings(df['File']),
+        'projectID': to_dicts(df['projectID'])
     }).reindex(config['target_columns'], axis=1)
 
     if show_orig_names:
         sdf = sdf.assign(**dict(df.Name))
     sdf = clean_technology(sdf, generalize_hydros=False)
-    sdf.reset_index(drop=True)
+    sdf = set_categories(sdf, config=config)
     if show_orig_names:
         return sdf
     else:
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright 2016-2018 Fabian Hofmann (FIAS), Jonas Hoersch (KIT, IAI) and
+# Fabian Gotzens (FZJ, IEK-STE)
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Registry of the power plant data sources and their metadata. The importers
+in powerplantmatching.data are only imported when a source is read.
+"""
+
+from __future__ import absolute_import
+
+from importlib import import_module
+from .utils import _data_in
+
+
+def source_schema(**dtypes):
+    """
+    Return the columns and dtypes of the data of a source as returned by
+    powerplantmatching.collection.collect(), where the projectID holds the
+    list of ids of the aggregated units. The categories are set by
+    powerplantmatching.utils.set_categories(). Keyword arguments override
+    single dtypes.
+    """
+    schema = {'Name': 'str',
+              'Fueltype': 'category',
+              'Technology': 'category',
+              'Set': 'category',
+              'Country': 'category',
+              'Capacity': 'float',
+              'Efficiency': 'float',
+              'Duration': 'float',
+              'YearCommissioned': 'float',
+              'Retrofit': 'float',
+              'lat': 'float',
+              'lon': 'float',
+              'File': 'str',
+              'projectID': 'list'}
+    schema.update(dtypes)
+    return schema
+
+
+# schema of the reduced matched data, where the projectID holds a dict of the
+# lists of ids by source
+matched_schema = source_schema(projectID='dict')
+
+
+def entry_point(name):
+    """
+    Return a function calling the importer powerplantmatching.data.<name>,
+    which imports powerplantmatching.data on the first call only.
+    """
+    def read_function(*args, **kwargs):
+        data = import_module(__name__.rsplit('.', 1)[0] + '.data')
+        return getattr(data, name)(*args, **kwargs)
+    read_function.__name__ = name
+    return read_function
+
+
+source_registry = {
+    'OPSD': {'read_function': entry_point('OPSD'),
+             'schema': source_schema(),
+             'reliability_score': 5,
+             'net_capacity': True,
+             'source_file': [_data_in('conventional_power_plants_EU.csv'),
+                             _data_in('conventional_power_plants_DE.csv')]},
+    'GEO': {'read_function': entry_point('GEO'),
+            'schema': source_schema(),
+            'aggregated_units': False,
+            'reliability_score': 3,
+            'net_capacity': False,
+            'source_file': _data_in('global_energy_observatory'
+                                    '_power_plants.sqlite')},
+    'CARMA': {'read_function': entry_point('CARMA'),
+              'schema': source_schema(),
+              'reliability_score': 1,
+              'net_capacity': False,
+              'source_file': _data_in('Full_CARMA_2009_Dataset_1.csv')},
+    'IWPDCY': {'read_function': entry_point('IWPDCY'),
+               'schema': source_schema(),
+               'aggregated_units': True,
+               'reliability_score': 3,
+               'source_file': _data_in('IWPDCY.csv')},
+    'GPD': {'read_function': entry_point('GPD'),
+            'schema': source_schema(),
+            'aggregated_units': False,
+            'reliability_score': 3,
+            'source_file': _data_in('global_power_plant_database.csv')},
+    'ESE': {'read_function': entry_point('ESE'),
+            'schema': source_schema(),
+            'reliability_score': 6,
+            'source_file': _data_in('projects.xls')},
+    'ENTSOE': {'read_function': entry_point('ENTSOE'),
+               'schema': source_schema(),
+               'reliability_score': 4,
+               'net_capacity': True,
+               'source_file': _data_in('entsoe_powerplants.csv')},
+    'WEPP': {'read_function': entry_point('WEPP'),
+             'schema': source_schema(),
+             'reliability_score': 4,
+             'net_capacity': False,
+             'source_file': _data_in('platts_wepp.csv')},
+    'UBA': {'read_function': entry_point('UBA'),
+            'schema': source_schema(),
+            'aggregated_units': False,
+            'net_capacity': False,
+            'reliability_score': 5,
+            'source_file': _data_in('kraftwerke-de-ab-100-mw.xls')},
+    'BNETZA': {'read_function': entry_point('BNETZA'),
+               'schema': source_schema(),
+               'net_capacity': True,
+               'reliability_score': 3,
+               'source_file': _data_in('Kraftwerksliste_2017_2.xlsx')}}
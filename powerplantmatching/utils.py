@@ -31,6 +31,7 @@ import logging
 import numpy as np
 import sys
 import multiprocessing
+import weakref
 from ast import literal_eval as liteval
 
 
@@ -98,7 +99,7 @@ def lookup(df, keys=None, by='Country, Fueltype', exclude=None, unit='MW'):
             by = by.replace(' ', '').split(',')
         if exclude is not None:
             df = df[~df.Fueltype.isin(exclude)]
-        return df.groupby(by).Capacity.sum()
+        return df.groupby(by, observed=True).Capacity.sum()
 
     if isinstance(df, list):
         dfs = pd.concat([lookup_single(a) for a in df], axis=1, keys=keys)
@@ -108,6 +109,47 @@ def lookup(df, keys=None, by='Country, Fueltype', exclude=None, unit='MW'):
         return (lookup_single(df)/scaling).fillna(0.).round(3)
 
 
+# categorical columns and the config entries listing their categories
+categorical_columns = {'Country': 'target_countries',
+                       'Fueltype': 'target_fueltypes',
+                       'Technology': 'target_technologies',
+                       'Set': 'target_sets'}
+
+
+def set_categories(df, config=None):
+    """
+    Cast the columns 'Country', 'Fueltype', 'Technology' and 'Set' to
+    pandas.Categorical. The categories are taken from the config entries
+    'target_countries', 'target_fueltypes', 'target_technologies' and
+    'target_sets', extended by the values not listed there. For matched
+    dataframes, all datasets of a column share the same categories.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Powerplant data, either in reduced or in matched form
+    config : dict, default None
+        Configuration overrides varying from the config.yaml file
+    """
+    if config is None:
+        config = get_config()
+    df = df.copy()
+    for col, key in categorical_columns.items():
+        if col not in df.columns.get_level_values(0):
+            continue
+        values = pd.unique(np.asarray(df[col], dtype=object).ravel())
+        targets = list(config.get(key, []))
+        others = set(values[pd.notnull(values)]) - set(targets)
+        dtype = pd.api.types.CategoricalDtype(targets +
+                                              sorted(others, key=str))
+        if df.columns.nlevels > 1:
+            for sub in df[col].columns:
+                df[(col, sub)] = df[(col, sub)].astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
 def config_filter(df, name=None, config=None):
     """
     Convenience function to filter data source according to the config.yaml
@@ -149,7 +191,7 @@ def correct_manually(df, name, config=None):
     name : str
         Name of the data source, should be in columns of manual_corrections.csv
     """
-    from .data import data_config
+    from .sources import source_registry
     if config is None:
         config = get_config()
 
@@ -160,7 +202,7 @@ def correct_manually(df, name, config=None):
                    .set_index(name))
     if len(corrections) == 0:
         return df.reindex(columns=config['target_columns'])
-    source_file = data_config[name]['source_file']
+    source_file = source_registry[name]['source_file']
     # assume OPSD files are updated on the same time
     if isinstance(source_file, list):
         source_file = source_file[0]
@@ -207,9 +249,9 @@ def read_csv_if_string(data):
     """
     Convenience function to import powerplant data source if a string is given.
     """
-    from .data import data_config
+    from .sources import source_registry
     if isinstance(data, six.string_types):
-        data = data_config[data]['read_function']()
+        data = source_registry[data]['read_function']()
     return data
 
 
@@ -244,15 +286,193 @@ def projectID_to_dict(df):
         return df.assign(projectID=df.projectID.apply(lambda df: liteval(df)))
 
 
-def select_by_projectID(df, projectID, dataset_name=None):
+def projectID_table(df):
     """
-    Convenience function to select data by its projectID
+    Return the projectIDs of reduced or matched powerplant data as a long
+    table with one row per original projectID. The column 'plant_row' gives
+    the position of the powerplant in df and 'source' the data source. The
+    table is indexed by the original projectIDs ('source_id'), which allows
+    hash based lookups, see select_by_projectID().
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Powerplant data with a projectID column of dicts, lists or strings
     """
-    if isinstance(df.projectID.iloc[0], text):
-        return df.query("projectID == @projectID")
+    rows, sources, ids = [], [], []
+    if df.columns.nlevels > 1:
+        columns = [(s, df.projectID[s].values) for s in df.projectID.columns]
+    else:
+        columns = [(None, df.projectID.values)]
+    for source, values in columns:
+        for row, value in enumerate(values):
+            items = value.items() if isinstance(value, dict) else \
+                [(source, value)]
+            for key, v in items:
+                if isinstance(v, (list, tuple, np.ndarray)):
+                    rows += [row] * len(v)
+                    sources += [key] * len(v)
+                    ids += list(v)
+                elif isinstance(v, six.string_types):
+                    rows.append(row)
+                    sources.append(key)
+                    ids.append(v)
+    return pd.DataFrame({'plant_row': np.array(rows, dtype=int),
+                         'source': pd.Series(sources, dtype=object),
+                         'source_id': pd.Series(ids, dtype=object)},
+                        columns=['plant_row', 'source', 'source_id']
+                        ).set_index('source_id')
+
+
+def projectID_from_table(df, ids):
+    """
+    Inverse of projectID_table(), return df with the projectIDs rebuilt
+    from the table ids.
+    """
+    values = zip(ids.plant_row.values, ids.source.values, ids.index.values)
+    df = df.copy()
+    if df.columns.nlevels > 1:
+        lists = {s: np.full(len(df), np.nan, dtype=object)
+                 for s in ids.source.unique()}
+        for row, source, i in values:
+            if not isinstance(lists[source][row], list):
+                lists[source][row] = []
+            lists[source][row].append(i)
+        for source, column in lists.items():
+            df[('projectID', source)] = column
+        return df
+    dicts = [{} for _ in range(len(df))]
+    for row, source, i in values:
+        dicts[row].setdefault(source, []).append(i)
+    df['projectID'] = pd.Series(dicts, index=df.index, dtype=object)
+    return df
+
+
+def cache_format(config=None):
+    """
+    Return the format of the cache files as given by config['cache_format'],
+    either 'parquet' (requires pyarrow) or 'csv'.
+    """
+    if config is None:
+        config = get_config()
+    fmt = config.get('cache_format', 'csv')
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("Writing csv instead of parquet cache files since "
+                           "pyarrow is not installed.")
+            fmt = 'csv'
+    return fmt
+
+
+def cache_file(fn, config=None):
+    """
+    Return the path of the cache file fn, given without file extension.
+    """
+    return fn + '.' + cache_format(config)
+
+
+def write_cache(df, fn, config=None):
+    """
+    Store powerplant data in reduced or matched form to the cache file fn,
+    given without file extension, see cache_format(). Parquet files keep the
+    dtypes, the MultiIndex columns and the lists and dicts of the projectID.
+    """
+    if cache_format(config) == 'parquet':
+        df.to_parquet(cache_file(fn, config))
     else:
-        return df[df['projectID'].apply(lambda x:
-                  projectID in sum(x.values(), []))]
+        # projectIDs are stored in long format next to the csv file
+        projectID_table(df).to_csv(fn + '_projectID.csv', encoding='utf-8')
+        df = df.copy()
+        df['projectID'] = np.nan
+        df.to_csv(cache_file(fn, config), index_label='id', encoding='utf-8')
+
+
+def read_cache(fn, header=0, config=None):
+    """
+    Read powerplant data from the cache file fn, given without file
+    extension, see write_cache().
+
+    Parameters
+    ----------
+    fn : str
+        Path of the cache file without file extension
+    header : int or list of int, default 0
+        Header rows of a csv cache file, [0, 1] for matched data
+    """
+    if cache_format(config) == 'csv':
+        df = pd.read_csv(cache_file(fn, config), index_col=0, header=header,
+                         encoding='utf-8', low_memory=False)
+        if not os.path.exists(fn + '_projectID.csv'):
+            # cache files written before the projectID table was introduced
+            return projectID_to_dict(df)
+        ids = pd.read_csv(fn + '_projectID.csv', index_col=0,
+                          encoding='utf-8', dtype={'source_id': str})
+        return projectID_from_table(df, ids)
+
+    def to_python(ids):
+        # pyarrow returns arrays for lists and None for missing struct fields
+        if isinstance(ids, dict):
+            return {k: list(v) for k, v in ids.items() if v is not None}
+        return np.nan if ids is None else list(ids)
+
+    df = pd.read_parquet(cache_file(fn, config))
+    columns = [c for c in df.columns if c == 'projectID' or
+               (isinstance(c, tuple) and c[0] == 'projectID')]
+    for c in columns:
+        df[c] = pd.Series([to_python(i) for i in df[c]], index=df.index,
+                          dtype=object)
+    return df
+
+
+# projectID tables of the dataframes queried by select_by_projectID(), keyed
+# by their id and dropped when the dataframe is garbage collected
+_projectID_tables = {}
+
+
+def _cached_projectID_table(df):
+    """
+    Return projectID_table(df), built only once per dataframe (and length)
+    """
+    key = id(df)
+    hit = _projectID_tables.get(key)
+    if hit is not None and hit[0]() is df and hit[1] == len(df):
+        return hit[2]
+    ids = projectID_table(df)
+    ref = weakref.ref(df, lambda _: _projectID_tables.pop(key, None))
+    _projectID_tables[key] = (ref, len(df), ids)
+    return ids
+
+
+def select_by_projectID(df, projectID, dataset_name=None, ids=None):
+    """
+    Convenience function to select data by its projectID
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Powerplant data, either of a single source or in reduced or matched
+        form
+    projectID : str or list of str
+        Original projectID(s) to look up
+    dataset_name : str, default None
+        Only look up the projectIDs of this data source
+    ids : pd.DataFrame, default None
+        projectID table of df as returned by projectID_table(). By default
+        the table is built on the first lookup in df and reused for further
+        lookups, pass it if the projectIDs of df were modified in place.
+    """
+    if ids is None and df.columns.nlevels == 1 \
+            and isinstance(df.projectID.iloc[0], six.string_types):
+        return df[df.projectID.isin(to_list_if_string(projectID))]
+    if ids is None:
+        ids = _cached_projectID_table(df)
+    if dataset_name is not None:
+        ids = ids[ids.source == dataset_name]
+    pos = ids.index.get_indexer_for(to_list_if_string(projectID))
+    rows = np.unique(ids.plant_row.values[pos[pos >= 0]])
+    return df.iloc[rows]
 
 
 def update_saved_matches_for_(name):
@@ -271,6 +491,10 @@ def update_saved_matches_for_(name):
     >>> pm.collection.matched_data(update=True)
 
     Now the matched_data is updated with the modified version of ESE.
+
+    As the saved matches are keyed by a hash of the compared data (see
+    powerplantmatching.matching.matches_key), only the pairs whose data
+    changed are matched again, all others are read from the saved matches.
     """
     from .collection import collect
     from .matching import compare_two_datasets
@@ -280,22 +504,49 @@ def update_saved_matches_for_(name):
         compare_two_datasets([collect(to_match), df], [to_match, name])
 
 
-def fun(f, q_in, q_out):
+# function and arguments mapped by the worker processes of parmap(), only
+# set within the workers
+_parmap_task = {}
+
+
+def _parmap_init(f, arg_list):
+    """
+    Initializer of the worker processes of parmap(). The forked workers
+    inherit f and arg_list without pickling.
+    """
+    _parmap_task.update(f=f, arg_list=arg_list)
+
+
+def _parmap_worker(i):
+    """
+    Helper function for parmap(), applying the mapped function to the i-th
+    argument
+    """
+    return _parmap_task['f'](_parmap_task['arg_list'][i])
+
+
+def _shutdown_pool(pool):
     """
-    Helper function for multiprocessing in classes/functions
+    Shut down a pool of parmap() without waiting for hanging tasks
     """
-    while True:
-        i, x = q_in.get()
-        if i is None:
-            break
-        q_out.put((i, f(x)))
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
 
 
-def parmap(f, arg_list, config=None):
+def parmap(f, arg_list, config=None, timeout=None, retries=None,
+           progress=None):
     """
     Parallel mapping function. Use this function to parallely map function
-    f onto arguments in arg_list. The maximum number of parallel threads is
-    taken from config.yaml:parallel_duke_processes.
+    f onto arguments in arg_list. The maximum number of parallel processes is
+    taken from config.yaml:process_limit, parallelisation is switched off by
+    config.yaml:parallel_duke_processes.
+
+    Tasks run on a concurrent.futures process pool. The workers are forked
+    and inherit f and arg_list, such that neither closures nor large
+    dataframes have to be pickled, only the results are passed back. Where
+    forking is not available (or python < 3.7) a thread pool is used
+    instead.
 
     Paramters
     ---------
@@ -304,30 +555,140 @@ def parmap(f, arg_list, config=None):
         python funtion with one argument
     arg_list : list
         list of arguments mapped to f
-    """
+    timeout : float, default None
+        Seconds after which a running task is aborted, defaults to
+        config.yaml:task_timeout (no timeout if missing). On a thread pool,
+        the aborted task is abandoned but keeps running.
+    retries : int, default None
+        Number of times a failed or aborted task is resubmitted, before its
+        error is raised, defaults to config.yaml:task_retries or 0. If a
+        worker process crashes, all tasks running at that time are
+        resubmitted one at a time, and only the task which crashed its
+        worker again counts as failed.
+    progress : function, default None
+        Called as progress(done, total) after each finished task, defaults to
+        logging the progress
+    """
+    import concurrent.futures as cf
+    from concurrent.futures.process import BrokenProcessPool
+
     if config is None:
         config = get_config()
-    if config['parallel_duke_processes']:
-        nprocs = min(multiprocessing.cpu_count(), config['process_limit'])
-        logger.info('Run process with {} parallel threads.'.format(nprocs))
-        q_in = multiprocessing.Queue(1)
-        q_out = multiprocessing.Queue()
-
-        proc = [multiprocessing.Process(target=fun, args=(f, q_in, q_out))
-                for _ in range(nprocs)]
-        for p in proc:
-            p.daemon = True
-            p.start()
-
-        sent = [q_in.put((i, x)) for i, x in enumerate(arg_list)]
-        [q_in.put((None, None)) for _ in range(nprocs)]
-        res = [q_out.get() for _ in range(len(sent))]
-
-        [p.join() for p in proc]
-
-        return [x for i, x in sorted(res)]
+    if timeout is None:
+        timeout = config.get('task_timeout')
+    if retries is None:
+        retries = config.get('task_retries', 0)
+    if progress is None:
+        def progress(done, total):
+            logger.info('Finished {} of {} tasks'.format(done, total))
+
+    arg_list = list(arg_list)
+    total = len(arg_list)
+    if not config['parallel_duke_processes'] or total < 2:
+        res = []
+        for x in arg_list:
+            for attempt in range(retries + 1):
+                try:
+                    res.append(f(x))
+                    break
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    logger.warning('Task failed, retrying', exc_info=True)
+            progress(len(res), total)
+        return res
+
+    nprocs = min(multiprocessing.cpu_count(), config['process_limit'], total)
+    # mp_context and initializer of ProcessPoolExecutor require python 3.7
+    if (sys.version_info >= (3, 7) and
+            'fork' in multiprocessing.get_all_start_methods()):
+        def new_pool():
+            return cf.ProcessPoolExecutor(
+                    nprocs, mp_context=multiprocessing.get_context('fork'),
+                    initializer=_parmap_init, initargs=(f, arg_list))
+
+        def submit(pool, i):
+            return pool.submit(_parmap_worker, i)
     else:
-        return list(map(f, arg_list))
+        def new_pool():
+            return cf.ThreadPoolExecutor(nprocs)
+
+        def submit(pool, i):
+            return pool.submit(f, arg_list[i])
+    logger.info('Run process with {} parallel workers.'.format(nprocs))
+
+    res, attempts = {}, dict.fromkeys(range(total), 0)
+    pending = list(range(total))
+    # tasks which were running when a worker crashed, they are run alone
+    # until they finish or fail on their own
+    suspects = set()
+    pool = new_pool()
+    try:
+        running = {}
+        while pending or running:
+            # keep the number of submitted tasks to the number of workers,
+            # such that the start time of each task is known
+            while pending and len(running) < nprocs:
+                if (pending[0] in suspects and running or
+                        any(i in suspects for i, _ in running.values())):
+                    break
+                i = pending.pop(0)
+                running[submit(pool, i)] = (i, time.time())
+            wait = (None if timeout is None else
+                    max(0, min(start for _, start in running.values())
+                        + timeout - time.time()))
+            done, _ = cf.wait(running, timeout=wait,
+                              return_when=cf.FIRST_COMPLETED)
+
+            failed, crashed, broken = [], [], False
+            for future in done:
+                i, _ = running.pop(future)
+                try:
+                    res[i] = future.result()
+                    suspects.discard(i)
+                    progress(len(res), total)
+                except BrokenProcessPool as e:
+                    broken = True
+                    crashed.append((i, e))
+                except Exception as e:
+                    failed.append((i, e))
+            if len(crashed) == 1 and not running:
+                # the task crashed its worker on its own
+                failed.extend(crashed)
+            elif crashed:
+                # any of the tasks running on the pool may have crashed it,
+                # they are retried without counting the attempt
+                victims = [i for i, _ in crashed + list(running.values())]
+                logger.warning('A worker crashed while running the tasks {}, '
+                               'retrying them one at a time'.format(victims))
+                suspects.update(victims)
+                pending = [i for i, _ in crashed] + pending
+            if timeout is not None:
+                for future, (i, start) in list(running.items()):
+                    if time.time() - start >= timeout:
+                        running.pop(future)
+                        broken = True
+                        failed.append((i, cf.TimeoutError(
+                            'Task timed out after {} s'.format(timeout))))
+            if broken:
+                # the pool can not be used anymore, requeue all its tasks
+                _shutdown_pool(pool)
+                pool = new_pool()
+                pending = [i for i, _ in running.values()] + pending
+                running = {}
+
+            for i, e in failed:
+                attempts[i] += 1
+                if attempts[i] > retries:
+                    raise e
+                logger.warning('Task {} failed ({}), retrying'.format(i, e))
+                pending.append(i)
+        pool.shutdown()
+    except BaseException:
+        _shutdown_pool(pool)
+        raise
+
+    return [res[i] for i in range(total)]
 
 
 def country_alpha_2(country):
@@ -349,28 +710,18 @@ def breakdown_matches(df):
     ----------
     df : pd.DataFrame
         Matched data with not empty projectID-column. Keys of projectID must
-        be specified in powerplantmatching.data.data_config
+        be specified in powerplantmatching.sources.source_registry
     """
-    from .data import data_config
+    from .sources import source_registry
     assert('projectID' in df)
-    sources = set(df.projectID.apply(dict.keys).apply(list).sum())
+    ids = projectID_table(df)
     sources = pd.concat(
-            [data_config[s]['read_function']().set_index('projectID')
-             for s in sources])
-    if df.index.nlevels > 1:
-        stackedIDs = (df['projectID'].stack()
-                      .apply(pd.Series).stack()
-                      .dropna())
-    else:
-        stackedIDs = (df['projectID']
-                      .apply(pd.Series).stack()
-                      .apply(pd.Series).stack()
-                      .dropna())
-    return (sources
-            .reindex(stackedIDs)
-            .set_axis(stackedIDs.to_frame('projectID')
-                      .set_index('projectID', append=True).index,
-                      inplace=False))
+            [source_registry[s]['read_function']().set_index('projectID')
+             for s in ids.source.unique()])
+    index = pd.MultiIndex.from_arrays(
+            [df.index[ids.plant_row.values], ids.source.values, ids.index],
+            names=[df.index.name, 'source', 'projectID'])
+    return sources.reindex(ids.index).set_axis(index, axis=0)
 
 
 def parse_Geoposition(location, zipcode='', country='',
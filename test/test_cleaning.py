@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+import pandas as pd
+
+import powerplantmatching.cleaning as cleaning
+from powerplantmatching.cleaning import aggregate_groups, cliques
+
+how = {'Name': 'mode', 'Capacity': 'sum', 'projectID': 'list'}
+
+
+def test_aggregate_groups():
+    df = pd.DataFrame({'Name': ['A', 'A', 'B'], 'Capacity': [1., 2., 3.],
+                       'projectID': ['a1', 'a2', 'b1']})
+    res = aggregate_groups(df, pd.Series([0, 0, 1]), how)
+    assert res.Name.tolist() == ['A', 'B']
+    assert res.Capacity.tolist() == [3., 3.]
+    assert res.projectID.tolist() == [['a1', 'a2'], ['b1']]
+
+
+def test_aggregate_groups_empty():
+    df = pd.DataFrame({'Name': [], 'Capacity': [], 'projectID': []})
+    res = aggregate_groups(df, pd.Series([], dtype=float), how)
+    assert len(res) == 0
+    assert res.columns.tolist() == list(how)
+
+    res = aggregate_groups(df.reindex([0]), pd.Series([np.nan]), how)
+    assert len(res) == 0
+
+
+def test_cached_names_disk(tmp_path, monkeypatch):
+    (tmp_path / 'out').mkdir()
+    monkeypatch.setattr(cleaning, '_data_out',
+                        lambda fn, config=None: str(tmp_path / 'out' / fn))
+    monkeypatch.setattr(cleaning, '_name_cache', cleaning._name_cache.copy())
+    raw = ['Kraftwerk {} Power Station'.format(i) for i in range(1200)]
+    expected = [cleaning._clean_name(n) for n in raw]
+    assert cleaning.cached_names(raw[:700], persistent=True) == expected[:700]
+
+    # names found on disk are not cleaned again
+    cleaning._name_cache.clear()
+    cleaned = []
+    clean_name = cleaning._clean_name
+    monkeypatch.setattr(cleaning, '_clean_name',
+                        lambda n: cleaned.append(n) or clean_name(n))
+    assert cleaning.cached_names(raw, persistent=True) == expected
+    assert cleaned == raw[700:]
+
+
+def groups(df):
+    return sorted(sorted(g) for g in df.groupby('grouped').groups.values())
+
+
+def test_cliques():
+    # triangles a-b-c and c-d-e overlap in c, f-g is a pair, h is a singleton
+    # with a link in one direction only
+    df = pd.DataFrame({'Name': list('abcdefgh')}, index=list('abcdefgh'))
+    pairs = ['ab', 'ac', 'bc', 'cd', 'ce', 'de', 'fg']
+    pairs += [p[::-1] for p in pairs] + ['hf']
+    duplicates = pd.DataFrame({'one': [p[0] for p in pairs],
+                               'two': [p[1] for p in pairs]})
+
+    # c has the highest degree and takes the first triangle
+    assert groups(cliques(df, duplicates)) == \
+        [['a', 'b', 'c'], ['d', 'e'], ['f', 'g'], ['h']]
+    assert groups(cliques(df, duplicates, max_size=2)) == \
+        [['a', 'c'], ['b'], ['d', 'e'], ['f', 'g'], ['h']]
+    assert groups(cliques(df, duplicates, how='components')) == \
+        [['a', 'b', 'c', 'd', 'e'], ['f', 'g'], ['h']]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import io
+import itertools
+import os
+import sqlite3
+
+import pandas as pd
+
+import powerplantmatching.data as data
+from powerplantmatching.cleaning import gather_fueltype_info
+
+
+def test_cached_importer(monkeypatch):
+    monkeypatch.setattr(data, '_importer_cache', {})
+    calls = []
+
+    @data.cached_importer('OPSD')
+    def importer(raw=False, fueltypes=None, config=None):
+        calls.append((raw, fueltypes, config['target_countries']))
+        return pd.DataFrame({'Fueltype': fueltypes or ['Hydro']})
+
+    config = {'cache_format': 'csv', 'target_countries': ['Austria']}
+    other = dict(config, target_countries=['Austria', 'Germany'])
+
+    res = importer(config=config)
+    res['Fueltype'] = 'Wind'
+    # repeated calls are served from the cache, as copies
+    assert importer(config=config).Fueltype.tolist() == ['Hydro']
+    assert calls == [(False, None, ['Austria'])]
+
+    importer(fueltypes=['Solar'], config=config)
+    importer(config=other)
+    importer(fueltypes=['Solar'], config=config)
+    assert calls[1:] == [(False, ['Solar'], ['Austria']),
+                         (False, None, ['Austria', 'Germany'])]
+
+    # bypass arguments and positional arguments are not cached
+    del calls[:]
+    importer(raw=True, config=config)
+    importer(raw=True, config=config)
+    importer(False, None, config)
+    assert len(calls) == 3
+
+    keys = {data._importer_key('OPSD', 1, {}, config),
+            data._importer_key('OPSD', 1, {'fueltypes': ['Solar']}, config),
+            data._importer_key('OPSD', 1, {}, other)}
+    assert len(keys) == 3
+    assert data._importer_key('OPSD', 2, {}, config) not in keys
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        return iter([self.content[:3], self.content[3:]])
+
+    def close(self):
+        pass
+
+
+def test_fetch_entsoe(tmp_path, monkeypatch):
+    import requests
+    (tmp_path / 'out').mkdir()
+    monkeypatch.setattr(data, '_data_out',
+                        lambda fn, config=None: str(tmp_path / 'out' / fn))
+    status = {'A': 200, 'B': 400, 'C': 503}
+    requested = []
+
+    class Session(requests.Session):
+        def get(self, url, params, **kwargs):
+            requested.append(params['In_Domain'])
+            return FakeResponse(status[params['In_Domain']],
+                                '<{}/>'.format(params['In_Domain'])
+                                .encode('utf-8'))
+    monkeypatch.setattr(requests, 'Session', Session)
+    config = {'entsoe_connections': 2, 'entsoe_url': 'http://test'}
+
+    files = data.fetch_entsoe(['A', 'B', 'C', 'A'], 'token', config=config)
+    assert sorted(requested) == ['A', 'B', 'C']
+    # domains without data are kept, failed responses are not
+    files = {k: os.path.relpath(v, str(tmp_path)) for k, v in files.items()}
+    assert files == {'A': os.path.join('entsoe', 'A.xml'),
+                     'B': os.path.join('entsoe', 'B.xml'),
+                     'C': os.path.join('entsoe', 'C.xml.part')}
+    assert (tmp_path / 'entsoe' / 'A.xml').read_bytes() == b'<A/>'
+
+    del requested[:]
+    data.fetch_entsoe(['A', 'B', 'C'], 'token', use_saved_responses=True,
+                      config=config)
+    assert requested == ['C']
+
+
+def test_parse_entsoe(tmp_path):
+    series = ('<TimeSeries><registeredResource.name>{}'
+              '</registeredResource.name><MktPSRType><psrType>B11</psrType>'
+              '</MktPSRType><quantity>10</quantity></TimeSeries>')
+    names = [u'Alpha & Beta', u'Gamma &amp; Delta', u'Epsilon&#38;Zeta',
+             u'Eta &Theta']
+    fn = tmp_path / 'A71.xml'
+    fn.write_bytes(('<GL_MarketDocument xmlns="urn:test">{}'
+                    '</GL_MarketDocument>'
+                    .format(''.join(series.format(n) for n in names)))
+                   .encode('utf-8'))
+    records = list(data.parse_entsoe(str(fn)))
+    assert [r['registeredResource.name'] for r in records] == \
+        [u'Alpha & Beta', u'Gamma & Delta', u'Epsilon&Zeta', u'Eta &Theta']
+    assert records[0]['psrType'] == 'B11'
+    assert records[0]['quantity'] == '10'
+
+
+def test_escaped_ampersands():
+    # entities split across reads are not escaped twice
+    f = data._EscapedAmpersands(io.BytesIO(b'a & b &amp; c &#38; d &'))
+    chunks = []
+    while True:
+        chunk = f.read(3)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    assert b''.join(chunks) == b'a &amp; b &amp; c &#38; d &amp;'
+
+
+def geo_filter(df, config):
+    # filters applied by GEO() after reading the database
+    df = df.replace({'type': {'Gas': 'Natural Gas'}}).rename(
+            columns={'type': 'Fueltype', 'country': 'Country'})
+    df = gather_fueltype_info(df, search_col=['Type_of_Fuel_rng1_Primary'])
+    return df[df.Country.isin(config['target_countries']) &
+              df.Fueltype.isin(config['target_fueltypes'])]
+
+
+def test_geo_query(tmp_path):
+    rows = list(itertools.product(
+        ['Operating Fully', 'Decommissioned'], ['Austria', 'France'],
+        ['Gas', 'Coal', 'Hydro', 'Wind'],
+        ['', 'Lignite', 'Brown coal', 'Bituminous'], [0., 5., 50.]))
+    full = pd.DataFrame(rows, columns=['status_of_plant_itf', 'country',
+                                       'type', 'Type_of_Fuel_rng1_Primary',
+                                       'design_capacity_mwe_nbr'])
+    full['GEO_Assigned_Identification_Number'] = range(len(full))
+    db = sqlite3.connect(str(tmp_path / 'geo.sqlite'))
+    full.to_sql('powerplants', db, index=False)
+
+    for config in [{'target_countries': ['Austria'],
+                    'target_fueltypes': ['Natural Gas', 'Lignite'],
+                    'GEO_minimum_capacity': 10},
+                   {'target_countries': ['Austria', 'France'],
+                    'target_fueltypes': ['Hard Coal', 'Hydro'],
+                    'GEO_minimum_capacity': None}]:
+        where, params = data.geo_query(config)
+        pushed = pd.read_sql_query('SELECT * FROM powerplants WHERE ' + where,
+                                   db, params=params)
+        expected = full[(full.status_of_plant_itf == 'Operating Fully') &
+                        (full.design_capacity_mwe_nbr > 0) &
+                        (full.design_capacity_mwe_nbr >=
+                         (config['GEO_minimum_capacity'] or 0))]
+        expected = geo_filter(expected, config)
+        assert len(expected)
+        assert (geo_filter(pushed, config).GEO_Assigned_Identification_Number
+                .tolist() ==
+                expected.GEO_Assigned_Identification_Number.tolist())
+    db.close()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import powerplantmatching.linkage as linkage
+
+
+def plants():
+    # two units of the same plant ~3.3 km apart and an unrelated plant
+    return pd.DataFrame({'Name': ['Alpha', 'Alpha', 'Gamma'],
+                         'Fueltype': ['Natural Gas', 'Natural Gas', 'Hydro'],
+                         'Technology': ['CCGT', 'CCGT', 'Reservoir'],
+                         'Country': ['Austria', 'Austria', 'Austria'],
+                         'Capacity': [400., 400., 30.],
+                         'lat': [48., 48.03, 47.],
+                         'lon': [16., 16., 13.]})
+
+
+@pytest.mark.parametrize('s1, s2, expected', [
+    ('abc', 'abc', 1.), ('abc', 'def', 0.),
+    ('MARTHA', 'MARHTA', 0.961), ('DwAyNE', 'DuANE', 0.84),
+    ('DIXON', 'DICKSONX', 0.813), ('CRATE', 'TRACE', 0.733),
+    ('SHACKLEFORD', 'SHACKELFORD', 0.982), ('DUNNINGHAM', 'CUNNIGHAM', 0.896),
+    ('ITMAN', 'SMITH', 0.467), ('JON', 'JOHN', 0.933)])
+def test_jaro_winkler(s1, s2, expected):
+    # values of Duke's JaroWinklerTest
+    assert linkage.jaro_winkler(s1, s2) == pytest.approx(expected, abs=1e-3)
+
+
+def test_jaro_winkler_tokenized():
+    # tokens of the longer string are matched and averaged over its length
+    expected = (1. + linkage.jaro_winkler('beta', 'alpha')) / 2
+    assert linkage.jaro_winkler_tokenized('alpha', 'alpha beta') == \
+        pytest.approx(expected)
+    assert linkage.jaro_winkler_tokenized('alpha beta', 'alpha') == \
+        pytest.approx(expected)
+    assert linkage.jaro_winkler_tokenized('beta alpha', 'alpha beta') == 1.
+    assert linkage.jaro_winkler_tokenized('alpha', '') == 0.
+
+
+def test_geoposition():
+    assert linkage.geoposition(0., 5000.) == 1.
+    assert linkage.geoposition(3000., 5000.) == pytest.approx(0.7)
+    assert linkage.geoposition(5000., 5000.) == 0.5
+    assert linkage.geoposition(5001., 5000.) == 0.
+
+
+def test_geoposition_oslo_kiev():
+    # Duke's GeopositionComparatorTest with a max-distance of 2000 km
+    oslo = np.array([[59.913869, 10.752245]])
+    kiev = np.array([[50.45, 30.5234]])
+    ia, ib, dist = linkage.geo_neighbours(oslo, kiev, 2000000.)
+    sim = linkage.geoposition(dist, 2000000.)
+    assert len(sim) == 1
+    assert 0.5 + 0.5 * (1 - 1700. / 2000.) < sim[0]
+    assert sim[0] < 0.5 + 0.5 * (1 - 1550. / 2000.)
+
+
+def test_link_deduplication():
+    df = plants()
+    links = linkage.link(df, labels=['one', 'two'])
+    assert links.values.tolist() == [[0, 1], [1, 0]]
+
+    # expected score following Duke's property probabilities
+    dist = linkage.geo_neighbours(df[['lat', 'lon']].values[:1],
+                                  df[['lat', 'lon']].values[1:2], 5000.)[2]
+    probs = [0.99, 0.65, 0.51, 0.51, 0.51,
+             (0.75 - 0.5) * linkage.geoposition(dist[0], 5000.) ** 2 + 0.5]
+    expected = 0.5
+    for p in probs:
+        expected = linkage.bayes(expected, p)
+    conf = linkage.read_duke_config('Deleteduplicates.xml')
+    properties = [linkage._Property(p, [df]) for p in conf['properties']]
+    ia, ib, scores = linkage.score_pairs(properties, conf['threshold'],
+                                         np.array([0]), np.array([1]))
+    assert scores == pytest.approx([expected])
+
+
+def random_plants(n, seed):
+    rng = np.random.RandomState(seed)
+    df = pd.DataFrame({
+        'Name': rng.choice(['Alpha', 'Alpha Beta', 'Beta', 'Gamma'], n),
+        'Fueltype': rng.choice(['Hydro', 'Wind'], n),
+        'Technology': rng.choice(['Run-Of-River', 'Onshore'], n),
+        'Country': rng.choice(['Austria', 'Germany'], n),
+        'Capacity': rng.choice([10., 11., 50.], n),
+        'lat': 48. + rng.uniform(0, 0.1, n),
+        'lon': 13. + rng.uniform(0, 0.1, n)})
+    df.loc[rng.uniform(size=n) < 0.2, ['lat', 'lon']] = np.nan
+    return df
+
+
+def brute_force_neighbours(coords_a, coords_b, max_distance):
+    lat_a, lon_a = np.radians(coords_a).T[:, :, None]
+    lat_b, lon_b = np.radians(coords_b).T[:, None, :]
+    hav = (np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b)
+           * np.sin((lon_b - lon_a) / 2) ** 2)
+    dist = 2 * linkage.earth_radius * np.arcsin(np.sqrt(hav))
+    with np.errstate(invalid='ignore'):
+        ia, ib = np.nonzero(dist <= max_distance)
+    return ia, ib, dist[ia, ib]
+
+
+def test_geo_neighbours():
+    a, b = random_plants(40, 0), random_plants(30, 1)
+    coords_a, coords_b = a[['lat', 'lon']].values, b[['lat', 'lon']].values
+    ia, ib, dist = linkage.geo_neighbours(coords_a, coords_b, 5000.)
+    ea, eb, edist = brute_force_neighbours(coords_a, coords_b, 5000.)
+    found = pd.Series(dist, pd.MultiIndex.from_arrays([ia, ib])).sort_index()
+    expected = (pd.Series(edist, pd.MultiIndex.from_arrays([ea, eb]))
+                .sort_index())
+    assert found.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(found.values, expected.values, rtol=1e-6)
+
+
+def test_blocked_pairs_geo():
+    a, b = random_plants(40, 0), random_plants(30, 1)
+    ia, ib = map(np.concatenate,
+                 zip(*linkage.blocked_pairs([a, b], max_distance=5000.,
+                                            how='geo')))
+    pairs = set(zip(ia, ib))
+    na, nb, _ = linkage.geo_neighbours(a[['lat', 'lon']].values,
+                                       b[['lat', 'lon']].values, 5000.)
+    located_a = a.lat.notnull().values
+    located_b = b.lat.notnull().values
+    for i in range(len(a)):
+        for j in range(len(b)):
+            if located_a[i] and located_b[j]:
+                continue
+            # records without coordinates fall back to the Country blocking
+            expected = (a.Country[i] == b.Country[j]
+                        and a.Fueltype[i] == b.Fueltype[j])
+            assert ((i, j) in pairs) == expected
+    located = {(i, j) for i, j in pairs if located_a[i] and located_b[j]}
+    assert located == set(zip(na, nb))
+
+
+@pytest.mark.parametrize('blocking', ['geo', 'country'])
+def test_link_blocking(blocking):
+    # blocking must not drop any duplicate found by comparing all pairs
+    df = random_plants(60, 2)
+    unblocked = linkage.link(df)
+    assert len(unblocked)
+    pd.testing.assert_frame_equal(linkage.link(df, blocking=blocking),
+                                  unblocked)
+
+
+def test_link_blocking_geo_fallback():
+    # in record linkage distant pairs can match, geo blocking must not prune
+    # them and falls back to the Country blocking
+    a, b = random_plants(60, 2), random_plants(50, 3)
+    country = linkage.link([a, b], blocking='country')
+    geo = linkage.link([a, b], blocking='geo')
+    pd.testing.assert_frame_equal(geo, country)
+    unblocked = linkage.link([a, b])
+    ia, ib, _ = linkage.geo_neighbours(a[['lat', 'lon']].values,
+                                       b[['lat', 'lon']].values, 5000.)
+    neighbours = set(zip(ia, ib))
+    located = a.lat.notnull()[unblocked.one].values & \
+        b.lat.notnull()[unblocked.two].values
+    distant = [pair for pair in zip(unblocked.one[located],
+                                    unblocked.two[located])
+               if pair not in neighbours]
+    assert len(distant)
+    assert set(distant) <= set(zip(geo.one, geo.two))
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import numpy as np
+import pandas as pd
+
+import powerplantmatching.matching as matching
+
+
+def datasets():
+    return [pd.DataFrame({'Name': ['Alpha', 'Beta'],
+                          'Fueltype': ['Hydro', 'Hydro'],
+                          'Country': ['Austria', 'Austria'],
+                          'Capacity': [10., 20.]}),
+            pd.DataFrame({'Name': ['Alpha', 'Alpha beta'],
+                          'Fueltype': ['Hydro', 'Hydro'],
+                          'Country': ['Austria', 'Austria'],
+                          'Capacity': [10., 15.]})]
+
+
+def links():
+    # the best link of each entry of B uses A 0 twice
+    return pd.DataFrame({'A': [0, 0, 1], 'B': [0, 1, 0],
+                         'scores': [0.9, 0.85, 0.8]})
+
+
+def test_best_matches():
+    matches = matching.best_matches(links())
+    assert matches.values.tolist() == [[0, 0], [0, 1]]
+    matches = matching.best_matches(links(), one_to_one=True)
+    assert matches.values.tolist() == [[0, 1], [1, 0]]
+
+
+def test_compare_two_datasets_one_to_one(tmp_path, monkeypatch):
+    (tmp_path / 'matches').mkdir()
+    monkeypatch.setattr(matching, '_data_out',
+                        lambda fn, config=None: str(tmp_path / fn))
+    monkeypatch.setattr(matching, 'duke', lambda *args, **kwargs: links())
+    config = {'hash': 'test', 'one_to_one_matching': True}
+
+    matches = matching.compare_two_datasets(datasets(), ['A', 'B'],
+                                            config=config)
+    assert (matches.sort_values('A').values.tolist() == [[0, 1], [1, 0]])
+
+    matches = matching.compare_two_datasets(datasets(), ['A', 'B'],
+                                            one_to_one=False, config=config)
+    assert matches.values.tolist() == [[0, 0], [0, 1]]
+
+
+def test_compare_two_datasets_reuses_matches(tmp_path, monkeypatch):
+    (tmp_path / 'matches').mkdir()
+    monkeypatch.setattr(matching, '_data_out',
+                        lambda fn, config=None: str(tmp_path / fn))
+    monkeypatch.setattr(matching, 'duke', lambda *args, **kwargs: links())
+    config = {'hash': 'test'}
+    first = matching.compare_two_datasets(datasets(), ['A', 'B'],
+                                          config=config)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('matched again')
+    monkeypatch.setattr(matching, 'duke', fail)
+    second = matching.compare_two_datasets(datasets(), ['A', 'B'],
+                                           config=config)
+    assert second.values.tolist() == first.values.tolist()
+
+
+def name_links(datasets, labels, **kwargs):
+    # links all entries of equal names
+    a, b = (df[['Name']].rename_axis('id').reset_index() for df in datasets)
+    links = a.merge(b, on='Name')
+    return pd.DataFrame({labels[0]: links.id_x, labels[1]: links.id_y,
+                         'scores': 0.9})
+
+
+def test_incremental_matches(tmp_path, monkeypatch):
+    (tmp_path / 'matches').mkdir()
+    monkeypatch.setattr(matching, '_data_out',
+                        lambda fn, config=None: str(tmp_path / fn))
+    calls = []
+
+    def duke(datasets, labels, **kwargs):
+        calls.append([df.index.tolist() for df in datasets])
+        return name_links(datasets, labels)
+    monkeypatch.setattr(matching, 'duke', duke)
+    config = {'hash': 'test'}
+    a, b = datasets()
+    a['projectID'], b['projectID'] = ['a0', 'a1'], ['b0', 'b1']
+    matching.compare_two_datasets([a, b], ['A', 'B'], config=config)
+    assert calls == [[[0, 1], [0, 1]]]
+
+    # a new entry in A and a renamed entry in B
+    a = pd.concat([a, pd.DataFrame({'Name': ['Gamma'], 'Fueltype': ['Hydro'],
+                                    'Country': ['Austria'], 'Capacity': [5.],
+                                    'projectID': ['a2']}, index=[2])])
+    b.loc[1, 'Name'] = 'Gamma'
+    del calls[:]
+    matches = matching.compare_two_datasets([a, b], ['A', 'B'],
+                                            incremental=True, config=config)
+    # only the new entry of A is linked to all of B, and only the modified
+    # entry of B to the unchanged entries of A
+    assert calls == [[[2], [0, 1]], [[0, 1], [1]]]
+    assert matches.sort_values('A').values.tolist() == [[0, 0], [2, 1]]
+
+
+def test_cross_matches():
+    ab = pd.DataFrame({'A': [0, 1, 2, 3], 'B': [0, 1, 2, 3]})
+    bc = pd.DataFrame({'B': [0, 2], 'C': [0, 5]})
+    ac = pd.DataFrame({'A': [1, 2], 'C': [1, 6]})
+    matches = matching.cross_matches([ab, bc, ac], labels=['A', 'B', 'C'])
+    # A 0 and C 0 are only linked through B 0, the component of A 2 holds
+    # C 5 and C 6 and is resolved by the direct matches of A 2
+    assert matches.astype(float).fillna(-1).values.tolist() == \
+        [[0, 0, 0], [1, 1, 1], [2, 2, 6], [3, 3, -1]]
+
+
+def test_reduce_matched_dataframe():
+    columns = ['Name', 'Fueltype', 'Technology', 'Set', 'Country',
+               'Capacity', 'Duration', 'YearCommissioned', 'Retrofit', 'lat',
+               'lon', 'File', 'projectID']
+    sources = ['OPSD', 'GEO', 'GPD', 'CARMA']
+    values = {
+        'Name': [[np.nan, np.nan, 'Gpd', 'Carma'],
+                 ['Opsd', 'Geo', np.nan, np.nan],
+                 [np.nan, np.nan, np.nan, 'Carma']],
+        'Fueltype': [['Hydro'] * 4] * 3,
+        'Country': [['Austria'] * 4] * 3,
+        # GEO and GPD share the same reliability score and are aggregated
+        'Capacity': [[np.nan, 100., 200., 50.],
+                     [300., 100., np.nan, np.nan],
+                     [np.nan, np.nan, np.nan, 10.]],
+        'lat': [[np.nan, 47., np.nan, 48.], [np.nan] * 4, [np.nan] * 4]}
+    df = pd.concat([pd.DataFrame(values.get(col, np.nan), index=range(3),
+                                 columns=sources,
+                                 dtype=object if col in values else float)
+                    for col in columns], axis=1, keys=columns)
+    for col in ['Capacity', 'lat']:
+        df[col] = df[col].astype(float)
+    config = {'target_columns': columns}
+
+    reduced = matching.reduce_matched_dataframe(df, config=config)
+    assert reduced.Name.tolist() == ['Gpd', 'Opsd', 'Carma']
+    assert reduced.Capacity.tolist() == [150., 300., 10.]
+    assert reduced.lat[0] == 47.
+    # all-NaN rows and columns stay missing
+    assert reduced.lat[1:].isnull().all()
+    assert reduced.Duration.isnull().all()
+
+
+def test_compare_two_datasets_legacy_matches(tmp_path, monkeypatch, caplog):
+    (tmp_path / 'matches').mkdir()
+    monkeypatch.setattr(matching, '_data_out',
+                        lambda fn, config=None: str(tmp_path / fn))
+    monkeypatch.setattr(matching, 'duke', lambda *args, **kwargs: links())
+    legacy = tmp_path / 'matches' / 'matches_A_B.csv'
+    pd.DataFrame({'A': [1], 'B': [1]}).to_csv(str(legacy))
+
+    matches = matching.compare_two_datasets(datasets(), ['A', 'B'],
+                                            config={'hash': 'test'})
+    # the unkeyed matches are not reused but replaced
+    assert matches.values.tolist() == [[0, 0], [0, 1]]
+    assert not legacy.exists()
+    assert len(list((tmp_path / 'matches').glob('matches_A_B_*.csv'))) == 2
+    assert 'earlier version' in caplog.text
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import gc
+
+import numpy as np
+import pandas as pd
+
+import powerplantmatching.utils as utils
+
+
+def reduced():
+    return pd.DataFrame({'Name': ['Alpha', 'Beta', 'Gamma'],
+                         'projectID': [{'OPSD': ['o1', 'o2'], 'GEO': ['g1']},
+                                       {'GEO': ['g2']},
+                                       {'OPSD': ['o3']}]})
+
+
+def matched():
+    columns = pd.MultiIndex.from_product([['Name', 'projectID'],
+                                          ['OPSD', 'GEO']])
+    return pd.DataFrame([['Alpha', 'Alpha', ['o1', 'o2'], ['g1']],
+                         [np.nan, 'Beta', np.nan, ['g2']]], columns=columns)
+
+
+def test_projectID_table():
+    df = reduced()
+    ids = utils.projectID_table(df)
+    assert sorted(zip(ids.index, ids.source, ids.plant_row)) == \
+        [('g1', 'GEO', 0), ('g2', 'GEO', 1), ('o1', 'OPSD', 0),
+         ('o2', 'OPSD', 0), ('o3', 'OPSD', 2)]
+    rebuilt = utils.projectID_from_table(df.assign(projectID=np.nan), ids)
+    assert rebuilt.projectID.tolist() == df.projectID.tolist()
+
+    df = matched()
+    ids = utils.projectID_table(df)
+    assert sorted(zip(ids.index, ids.source, ids.plant_row)) == \
+        [('g1', 'GEO', 0), ('g2', 'GEO', 1), ('o1', 'OPSD', 0),
+         ('o2', 'OPSD', 0)]
+    rebuilt = utils.projectID_from_table(df.drop('projectID', axis=1), ids)
+    for source in ['OPSD', 'GEO']:
+        assert rebuilt['projectID', source].fillna(0).tolist() == \
+            df['projectID', source].fillna(0).tolist()
+
+
+def test_select_by_projectID_cache(monkeypatch):
+    monkeypatch.setattr(utils, '_projectID_tables', {})
+    built = []
+    projectID_table = utils.projectID_table
+    monkeypatch.setattr(utils, 'projectID_table',
+                        lambda df: built.append(len(df)) or
+                        projectID_table(df))
+    df = reduced()
+    assert utils.select_by_projectID(df, 'o2').Name.tolist() == ['Alpha']
+    assert utils.select_by_projectID(df, ['g2', 'o3', 'x']).Name.tolist() \
+        == ['Beta', 'Gamma']
+    assert built == [3]
+
+    # a modified frame builds a new table
+    df.loc[3] = ['Delta', {'GEO': ['g3']}]
+    assert utils.select_by_projectID(df, 'g3').Name.tolist() == ['Delta']
+    assert utils.select_by_projectID(df, 'g2', dataset_name='OPSD').empty
+    assert built == [3, 4]
+
+    # the table is dropped with the frame
+    del df
+    gc.collect()
+    assert len(utils._projectID_tables) == 0